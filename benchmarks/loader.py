@@ -0,0 +1,76 @@
+"""
+Load time and peak memory of `hif_read`, `event_read` and `columnar_read`
+over generated YAML of growing size.
+
+    python -m benchmarks.loader [--sizes 50 100 200 400] [--max-ratio R]
+
+Prints how the time grows from one size to the next and exits with an error
+when a step multiplies it by more than `--max-ratio`. With the default sizes
+doubling, linear loading takes about x2 per step and quadratic loading x4.
+Each discopy layer keeps the full wire types on both sides of its box,
+so the memory of the diagram itself still grows with width times depth,
+`columnar_read` keeps one box id and offset per layer instead.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+
+from widip.loader import columnar_read, event_read, hif_read
+
+
+LOADERS = {"hif_read": hif_read, "event_read": event_read, "columnar_read": columnar_read}
+
+
+def synthetic_yaml(kind, n):
+    if kind == "mapping":
+        return "".join(f"k{i}: !echo v{i}\n" for i in range(n))
+    if kind == "sequence":
+        return "".join(f"- !echo v{i}\n" for i in range(n))
+    if kind == "stream":
+        return "".join(f"--- !echo v{i}\n" for i in range(n))
+    raise ValueError(kind)
+
+def load_time(load, source, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load(source)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def load_peak_memory(load, source):
+    tracemalloc.start()
+    try:
+        load(source)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--kinds", nargs="+", default=["mapping", "sequence", "stream"])
+    parser.add_argument("--loaders", nargs="+", choices=LOADERS, default=list(LOADERS))
+    parser.add_argument("--max-ratio", type=float, default=3.0)
+    args = parser.parse_args(argv[1:])
+
+    status = 0
+    for name in args.loaders:
+        load = LOADERS[name]
+        for kind in args.kinds:
+            previous = None
+            for n in args.sizes:
+                source = synthetic_yaml(kind, n)
+                t = load_time(load, source)
+                peak = load_peak_memory(load, source)
+                ratio = "" if previous is None else f" x{t / previous[1]:.2f} for x{n / previous[0]:.2f} size"
+                print(f"{name:>10} {kind:>8} {n:>6}: {t * 1000:9.1f}ms {peak / 2**20:7.1f}MiB{ratio}")
+                if previous and args.max_ratio and t / previous[1] > args.max_ratio:
+                    print(f"regression: {name} {kind} load time grew more than x{args.max_ratio}")
+                    status = 1
+                previous = n, t
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
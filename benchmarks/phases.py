@@ -0,0 +1,138 @@
+"""
+Times the load, compile, run and draw phases of widip programs.
+
+    python -m benchmarks.phases [--phases read compile run draw] [--save]
+
+Runs over examples/aoc2025, examples/mascarpone, src/data and generated YAML
+of growing size. Results are compared with the baseline file when there is one,
+phases slower than the baseline by more than `--tolerance` are reported as regressions.
+`--save` stores the current results as the new baseline, along with the machine
+they were measured on: timings only compare on the same machine, so no baseline is committed.
+Caches go to a temporary directory, a benchmark neither reads nor fills the user's.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from widip.files import diagram_draw
+from widip.lang import Compile
+from widip.loader import repl_read
+from widip.widish import widish_run
+
+from .loader import synthetic_yaml
+
+
+CORPORA = ("examples/aoc2025", "examples/mascarpone", "src/data")
+SYNTHETIC_SIZES = (10, 50, 100)
+PHASES = ("read", "compile", "run", "draw")
+BASELINE = Path(__file__).parent / "baseline.json"
+
+
+def sources(corpora, sizes):
+    for corpus in corpora:
+        for path in sorted(Path(corpus).glob("**/*.yaml")):
+            yield str(path), path.read_text()
+    for kind in ("mapping", "sequence"):
+        for n in sizes:
+            yield f"synthetic/{kind}-{n}", synthetic_yaml(kind, n)
+
+def best_time(f, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def time_phases(source, phases, repeat, draw_dir):
+    """Seconds per phase, phases that fail are recorded in `errors` instead."""
+    results, errors = {}, {}
+    try:
+        results["read"], fd = best_time(lambda: repl_read(source), repeat)
+    except Exception as e:
+        return {"errors": {"read": error_message(e)}}
+    path = Path(draw_dir) / "diagram.yaml"
+    runs = {
+        "compile": (lambda: Compile()(fd), repeat),
+        "run": (lambda: widish_run(fd, ""), repeat),
+        "draw": (lambda: diagram_draw(path, fd), 1)}
+    for phase in PHASES[1:]:
+        if phase not in phases:
+            continue
+        f, n = runs[phase]
+        try:
+            results[phase], _ = best_time(f, n)
+        except Exception as e:
+            errors[phase] = error_message(e)
+    if errors:
+        results["errors"] = errors
+    return results
+
+def error_message(e):
+    return " ".join(f"{type(e).__name__}: {e}".split())[:120]
+
+def regressions(results, baseline, tolerance, noise):
+    for name, phases in results.items():
+        for phase, t in phases.items():
+            base = baseline.get(name, {}).get(phase)
+            if phase == "errors" or not isinstance(base, float):
+                continue
+            if t > base * (1 + tolerance) and t - base > noise:
+                yield name, phase, base, t
+
+def machine():
+    import discopy
+    return {
+        "platform": platform.platform(), "processor": platform.machine(),
+        "python": platform.python_version(), "discopy": discopy.__version__}
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=list(PHASES))
+    parser.add_argument("--corpora", nargs="*", default=list(CORPORA))
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(SYNTHETIC_SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown relative to the baseline")
+    parser.add_argument("--noise", type=float, default=0.002,
+                        help="Slowdowns under this many seconds are ignored")
+    parser.add_argument("--save", action="store_true", help="Store results as the baseline")
+    args = parser.parse_args(argv[1:])
+
+    results = {}
+    with tempfile.TemporaryDirectory() as draw_dir:
+        os.environ["WIDIP_CACHE_DIR"] = str(Path(draw_dir) / "cache")
+        for name, source in sources(args.corpora, args.sizes):
+            results[name] = time_phases(source, args.phases, args.repeat, draw_dir)
+            timings = " ".join(
+                f"{phase} {results[name][phase] * 1000:.1f}ms"
+                for phase in PHASES if phase in results[name])
+            errors = " ".join(
+                f"{phase} failed ({error})"
+                for phase, error in results[name].get("errors", {}).items())
+            print(f"{name}: {timings} {errors}".rstrip(), flush=True)
+
+    status = 0
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        print(f"baseline measured on {baseline['machine']}")
+        for name, phase, base, t in regressions(
+                results, baseline["results"], args.tolerance, args.noise):
+            print(f"regression: {name} {phase} {base * 1000:.1f}ms -> {t * 1000:.1f}ms")
+            status = 1
+    elif not args.save:
+        print(f"no baseline at {args.baseline}, record one with --save to compare")
+    if args.save:
+        baseline = {"machine": machine(), "results": results}
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"saved baseline to {args.baseline}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
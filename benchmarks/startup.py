@@ -0,0 +1,40 @@
+"""
+Startup time of `python -m widip -n file.yaml`.
+
+    python -m benchmarks.startup [file.yaml] [--repeat N] [--max-ms MS]
+
+Exits with an error when the median run is slower than `--max-ms`.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+def startup_times(file_name, repeat):
+    argv = [sys.executable, "-m", "widip", "-n", file_name]
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_name", nargs="?", default="examples/hello-world.yaml")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args(argv[1:])
+
+    times = startup_times(args.file_name, args.repeat)
+    median = statistics.median(times)
+    print(f"startup {args.file_name}: median {median:.1f}ms, min {min(times):.1f}ms")
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"regression: median above {args.max_ms:.1f}ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,56 @@
+from fractions import Fraction
+
+import pytest
+from discopy import closed
+
+from widip.binary import dumps, load, loads, dump
+from widip.computer import *
+from widip.lang import *
+from widip.metaprog import Computation, Metaprogram, Program
+
+
+A, B, C = Ty("A"), Ty("B"), Ty("C")
+F, G = Box("F", Ty(), B << A), Box("G", Ty(), C << B)
+
+
+@pytest.mark.parametrize("diagram", [
+    Sequential(F, G) >> Box("h", C, A),
+    Parallel(F, Box("T", Ty(), C << B)),
+    Partial(Box("Γ", Ty(), C << A @ B)),
+    Data(A),
+    Copy(A) >> Swap(A, A) >> Delete(A) @ A,
+    Eval(B << A),
+    closed.Curry(Box("f", A @ B, C), 1),
+    closed.Box("job", closed.Ty(), closed.Ty("io"), data=[["ls", "-l"], ["wc"]]),
+    Metaprogram(Program(Computation("f", A, B, C))),
+])
+def test_round_trip(diagram):
+    loaded = loads(dumps(diagram))
+    assert loaded == diagram
+    assert type(loaded) is type(diagram)
+    assert loaded.__dict__.keys() == diagram.__dict__.keys()
+
+
+def test_load_from_memory_map_shares_objects(tmp_path):
+    f = Box("f", A, A)
+    path = tmp_path / "d.widip"
+    dump(f >> f >> f, path)
+    loaded = load(path)
+    assert loaded == f >> f >> f
+    assert len({id(box) for box in loaded.boxes}) == 1
+
+
+def test_rejects_other_data():
+    with pytest.raises(ValueError):
+        loads(bytes(128))
+
+
+def test_loads_builtin_classes_and_pickled_values():
+    box = closed.Box("f", closed.Ty(), closed.Ty(), data=[int, complex(1, 2)])
+    assert loads(dumps(box)) == box
+
+
+@pytest.mark.parametrize("data", [Fraction, Fraction(1, 2), closed.Functor, print])
+def test_refuses_classes_outside_widip_and_discopy(data):
+    with pytest.raises(ValueError):
+        loads(dumps(closed.Box("f", closed.Ty(), closed.Ty(), data=data)))
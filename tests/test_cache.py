@@ -0,0 +1,73 @@
+import os
+
+import discopy
+import pytest
+
+from widip.cache import cache_evict, cache_load, cache_store, code_version, content_key
+from widip.computer import Box, Ty
+from widip.files import diagram_draw, source_diagram
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("WIDIP_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_cache_round_trip():
+    d = Box("f", Ty("A"), Ty("B")) >> Box("g", Ty("B"), Ty("C"))
+    key = content_key(b"f: g")
+    assert cache_load("diagrams", key) is None
+    cache_store("diagrams", key, d, 2**20)
+    assert cache_load("diagrams", key) == d
+
+
+def test_content_key_depends_on_every_part():
+    assert content_key(b"ab", b"c") != content_key(b"a", b"bc")
+    assert content_key(b"a") == content_key(b"a")
+
+
+def test_content_key_depends_on_discopy_version(monkeypatch):
+    key = content_key(b"a")
+    monkeypatch.setattr(discopy, "__version__", "0")
+    code_version.cache_clear()
+    try:
+        assert content_key(b"a") != key
+    finally:
+        monkeypatch.undo()
+        code_version.cache_clear()
+    assert content_key(b"a") == key
+
+
+def test_cache_evicts_least_recently_used(cache_dir):
+    for i, key in enumerate("abc"):
+        cache_store("blobs", key, bytes(1000), 10**6)
+        os.utime(cache_dir / "blobs" / key, (i, i))
+    cache_load("blobs", "a")
+    cache_evict("blobs", 2 * len((cache_dir / "blobs" / "a").read_bytes()))
+    assert sorted(os.listdir(cache_dir / "blobs")) == ["a", "c"]
+
+
+def test_source_diagram_hits_cache(cache_dir):
+    first = source_diagram(b"")
+    assert len(os.listdir(cache_dir / "diagrams")) == 1
+    assert source_diagram(b"") == first
+
+
+def test_diagram_draw_skips_unchanged_diagrams(tmp_path, monkeypatch):
+    drawn = []
+    def draw(self, path, **params):
+        drawn.append(self)
+        with open(path, "w") as f:
+            f.write(repr(self))
+    f = lambda: Box("f", Ty("A"), Ty("B")) >> Box("g", Ty("B"), Ty("C"))
+    monkeypatch.setattr(type(f()), "draw", draw)
+    path = tmp_path / "f.yaml"
+    diagram_draw(path, f())
+    diagram_draw(path, f())
+    assert len(drawn) == 1
+    diagram_draw(path, Box("f", Ty("A"), Ty("B")))
+    assert len(drawn) == 2
+    path.with_suffix(".jpg").unlink()
+    diagram_draw(path, Box("f", Ty("A"), Ty("B")))
+    assert len(drawn) == 3
@@ -0,0 +1,66 @@
+import pytest
+from discopy import closed, python
+
+from widip.columnar import ColumnarDiagram
+from widip.computer import *
+from widip.lang import *
+from widip.loader import columnar_read, event_read
+
+
+A, B, C = Ty("A"), Ty("B"), Ty("C")
+F, G = Box("F", Ty(), B << A), Box("G", Ty(), C << B)
+
+
+def test_columnar_round_trip_shares_boxes_and_types():
+    f, g = Box("f", A, A), Box("g", A @ A, A)
+    diagram = f @ f >> g >> f >> f
+    columns = ColumnarDiagram.from_diagram(diagram)
+    assert len(columns) == 5
+    assert columns.boxes == [f, g]
+    assert list(columns.box_ids) == [0, 0, 1, 0, 0]
+    assert list(columns.box_offsets) == [0, 1, 0, 0, 0]
+    assert columns.to_diagram() == diagram
+
+
+def test_columnar_shares_equal_boxes_built_apart():
+    diagram = Box("f", A, A) >> Box("f", A, A) >> Box("f", A, A, data=1)
+    columns = ColumnarDiagram.from_diagram(diagram)
+    assert list(columns.box_ids) == [0, 0, 1]
+    assert columns.to_diagram() == diagram
+
+
+def test_columnar_map_compiles_each_box():
+    h = Box("h", C, A)
+    columns = ColumnarDiagram.from_diagram(Sequential(F, G) >> h)
+    assert columns.map(Compile()) == Sequential(F, G).specialize() >> h
+
+
+def test_columnar_map_matches_functor():
+    x = closed.Ty("x")
+    f, g = closed.Box("f", x, x), closed.Box("g", x @ x, x)
+    diagram = f @ x >> g >> f
+    functor = closed.Functor(
+        ob={x: int}, ar={f: lambda n: n + 1, g: lambda m, n: m * n},
+        cod=closed.Category(python.Ty, python.Function))
+    assert ColumnarDiagram.from_diagram(diagram).map(functor)(2, 3) == functor(diagram)(2, 3) == 10
+
+
+@pytest.mark.parametrize("yaml_text", [
+    "",
+    "''",
+    "['', ['']]",
+    "--- ''\n--- ['', '']\n",
+    "a: b\nc: !echo d\n",
+    "- !echo a\n- !tr {a: b}\n",
+])
+def test_columnar_read_matches_event_read(yaml_text):
+    columns = columnar_read(yaml_text)
+    assert isinstance(columns, ColumnarDiagram)
+    assert columns.to_diagram() == event_read(yaml_text)
+
+
+def test_columnar_tensor_shifts_offsets():
+    f = Box("f", A, A)
+    columns = A @ ColumnarDiagram.from_diagram(f) @ B >> Box("g", A @ A @ B, C)
+    assert list(columns.box_offsets) == [1, 0]
+    assert columns.to_diagram() == A @ f @ B >> Box("g", A @ A @ B, C)
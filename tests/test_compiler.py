@@ -2,6 +2,7 @@ import pytest
 
 from widip.computer import *
 from widip.lang import *
+from widip.svg import draw_svg
 from os import path
 
 SVG_ROOT_PATH = path.join("tests", "svg")
@@ -21,8 +22,8 @@ def after_each_test(request):
         
     left, right = data
     
-    left.draw(path=svg_path(f"{test_name}_left.svg"))
-    right.draw(path=svg_path(f"{test_name}_right.svg"))
+    draw_svg(left, svg_path(f"{test_name}_left.svg"))
+    draw_svg(right, svg_path(f"{test_name}_right.svg"))
 
 def test_fig_2_7_compile_sequential_to_left_side(request):
     """
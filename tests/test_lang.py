@@ -3,7 +3,7 @@ from functools import partial
 import pytest
 
 from widip.computer import *
-from widip.to_py import to_py
+from widip.to_py import PyBackend, to_py
 from widip.lang import *
 from discopy import closed, python
 from os import path
@@ -76,3 +76,22 @@ def test_cartesian_data_services(diagram_left, diagram_right, expected):
         left = left_f(*inputs)
         assert left == expected
         assert left == right_f(*inputs)
+
+
+def test_to_py_generates_one_flat_function():
+    B = Ty("B")
+    f = Box("f", X @ A, B)
+    g = Box("g", B, B @ B)
+    impls = {"f": lambda x, a: x + a, "g": lambda b: (b, b.upper())}
+    backend = PyBackend(lambda box: impls[box.name])
+    diagram = f.curry() @ A >> Eval(B << A) >> Copy(B) >> B @ g >> Delete(B) @ B @ B >> Swap(B, B)
+    py = backend(diagram)
+    with python.Function.no_type_checking:
+        assert py("x", "a") == ("XA", "xa")
+    assert py.inside.source.count("\n") == 5
+    assert backend(diagram) is py
+
+
+def test_to_py_rejects_boxes_without_implementation():
+    with pytest.raises(TypeError):
+        PyBackend()(Box("f", A, A))
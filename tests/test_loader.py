@@ -1,8 +1,12 @@
+import inspect
+import sys
+
 import pytest
 from discopy.closed import Curry, Eval
+from nx_yaml import nx_compose_all
 
-from widip.computer import Ty, Id
-from widip.loader import repl_read
+from widip.computer import Box, Ty, Id
+from widip.loader import event_read, hif_read, incidences_to_diagram, repl_read, sequence_all, tensor_all
 
 
 @pytest.mark.parametrize(["path", "yaml_text", "expected"], [
@@ -36,3 +40,64 @@ from widip.loader import repl_read
 def test_loader_encoding(path, yaml_text, expected):
     actual = repl_read(yaml_text)
     assert actual == expected
+
+
+def test_tensor_all_matches_repeated_tensor():
+    f, g, h = (Box(n, Ty(n + "0"), Ty(n + "1")) for n in "fgh")
+    assert tensor_all([f, g >> Box("k", Ty("g1"), Ty()), h]) \
+        == f @ (g >> Box("k", Ty("g1"), Ty())) @ h
+
+
+def test_tensor_all_shares_types_between_layers():
+    f, g, h = (Box(n, Ty(n + "0"), Ty(n + "1")) for n in "fgh")
+    layers = tensor_all([f, g >> Box("k", Ty("g1"), Ty()), h]).inside
+    assert all(layer.dom is previous.cod for previous, layer in zip(layers, layers[1:]))
+    assert layers[1].boxes_or_types[0] is layers[2].boxes_or_types[0]
+
+
+def test_sequence_all_matches_left_fold():
+    A, B, C = Ty("A"), Ty("B"), Ty("C")
+    values = [Box("f", A, B << A), Box("g", Ty(), C << B), Box("h", B, A << C)]
+    ob = values[0]
+    for value in values[1:]:
+        ob = ob @ value
+        ob = ob >> Box("(;)", ob.cod, ob.cod[0].inside[0].exponent >> value.cod[0].inside[0].base)
+    assert sequence_all(values) == ob
+
+
+def test_deep_nesting_does_not_recurse():
+    depth = 300
+    graph = nx_compose_all("[" * depth + "''" + "]" * depth)
+    limit = sys.getrecursionlimit()
+    # Far fewer frames than nesting levels.
+    sys.setrecursionlimit(len(inspect.stack()) + 50)
+    try:
+        actual = incidences_to_diagram(graph)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert actual == repl_read("''")
+
+
+def test_repl_read_loads_deep_nesting():
+    depth = 1000
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(len(inspect.stack()) + 50)
+    try:
+        actual = repl_read("[" * depth + "''" + "]" * depth)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert actual == repl_read("''")
+
+
+@pytest.mark.parametrize("yaml_text", [
+    "",
+    "''",
+    "['', ['']]",
+    "--- ''\n--- ['', '']\n",
+    "? ''\n? ''\n",
+    "a",
+    "!X a",
+    "- !echo a\n- !tr {a: b}\n",
+])
+def test_event_read_matches_hif_read(yaml_text):
+    assert event_read(yaml_text) == hif_read(yaml_text)
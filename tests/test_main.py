@@ -0,0 +1,73 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from widip.client import default_socket_path
+
+
+@pytest.mark.parametrize("module", ["widip.__main__", "widip.widish"])
+def test_running_a_file_does_not_import_watchdog(module):
+    # Startup guard for `python -m widip -n file.yaml`, see benchmarks/startup.py.
+    code = f"import sys, {module}; assert 'watchdog' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_main_keeps_the_matplotlib_backend():
+    # Programs we run inherit our environment.
+    code = "import os, widip.__main__; assert os.environ['MPLBACKEND'] == 'TkAgg'"
+    subprocess.run([sys.executable, "-c", code], check=True, env={**os.environ, "MPLBACKEND": "TkAgg"})
+
+
+def test_client_runs_in_the_daemon(tmp_path):
+    socket_path = tmp_path / "widip.sock"
+    daemon = subprocess.Popen([sys.executable, "-m", "widip", "--daemon", str(socket_path)])
+    try:
+        for _ in range(300):
+            if socket_path.exists():
+                break
+            time.sleep(0.1)
+        assert socket_path.stat().st_mode & 0o777 == 0o600
+        client = [sys.executable, "-m", "widip.client"]
+        run = lambda *args, input=None: subprocess.run(
+            client + list(args), input=input, capture_output=True, text=True,
+            env={**os.environ, "WIDIP_SOCKET": str(socket_path)})
+        result = run("--help")
+        assert (result.returncode, result.stdout.startswith("usage:")) == (0, True)
+        result = run("--no-such-flag")
+        assert result.returncode == 2 and "unrecognized arguments" in result.stderr
+        # The program reads our stdin and writes our stdout.
+        result = run("--stream", input="--- !echo hello\n")
+        assert (result.returncode, result.stdout) == (0, "hello\n")
+        # A second daemon leaves the first one's socket alone.
+        second = subprocess.run(
+            [sys.executable, "-m", "widip", "--daemon", str(socket_path)], capture_output=True)
+        assert second.returncode == 1 and run("--help").returncode == 0
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+
+def test_client_runs_widip_without_a_daemon(tmp_path):
+    # A socket left by a killed daemon.
+    socket_path = tmp_path / "widip.sock"
+    socket.socket(socket.AF_UNIX).bind(str(socket_path))
+    result = subprocess.run(
+        [sys.executable, "-m", "widip.client", "--help"], capture_output=True, text=True,
+        env={**os.environ, "WIDIP_SOCKET": str(socket_path)})
+    assert (result.returncode, result.stdout.startswith("usage:")) == (0, True)
+
+
+def test_default_socket_is_in_a_private_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("WIDIP_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    socket_dir = os.path.dirname(default_socket_path())
+    assert os.stat(socket_dir).st_mode & 0o777 == 0o700
+    os.chmod(socket_dir, 0o755)
+    with pytest.raises(PermissionError):
+        default_socket_path()
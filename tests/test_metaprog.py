@@ -2,6 +2,7 @@ import pytest
 
 from widip.computer import *
 from widip.metaprog import *
+from widip.svg import draw_svg
 from os import path
 
 
@@ -23,9 +24,9 @@ def after_each_test(request):
         
     comp, prog, mprog = data
     
-    comp.draw(path=svg_path(f"{test_name}_comp.svg"))
-    prog.draw(path=svg_path(f"{test_name}_prog.svg"))
-    mprog.draw(path=svg_path(f"{test_name}_mprog.svg"))
+    draw_svg(comp, svg_path(f"{test_name}_comp.svg"))
+    draw_svg(prog, svg_path(f"{test_name}_prog.svg"))
+    draw_svg(mprog, svg_path(f"{test_name}_mprog.svg"))
 
 def test_fig_6_1_program_and_metaprogram(request):
     """
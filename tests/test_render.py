@@ -0,0 +1,36 @@
+import time
+from pathlib import Path
+
+from discopy.closed import Box, Ty
+
+from widip import files, render
+from widip.render import RenderPool
+
+
+def slow_draw(path, diagram):
+    time.sleep(0.3)
+    with open(path, "a") as f:
+        f.write(f"{diagram}\n")
+
+
+def test_render_pool_coalesces_drawings_of_a_path(tmp_path):
+    pool = RenderPool(draw=slow_draw)
+    a, b = tmp_path / "a.log", tmp_path / "b.log"
+    start = time.monotonic()
+    for diagram in ("first", "second", "third"):
+        pool.submit(a, diagram)
+    pool.submit(b, "other")
+    assert time.monotonic() - start < 0.3
+    pool.shutdown()
+    assert a.read_text() == "first\nthird\n"
+    assert b.read_text() == "other\n"
+
+
+def test_draw_async_skips_drawn_images(tmp_path, monkeypatch):
+    monkeypatch.setenv("WIDIP_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(files, "DRAW_FORMAT", "svg")
+    monkeypatch.setattr(render, "render_pool", None)
+    path, diagram = tmp_path / "f.yaml", Box("f", Ty("A"), Ty("B"))
+    files.diagram_draw(path, diagram)
+    render.draw_async(path, diagram)
+    assert render.render_pool is None
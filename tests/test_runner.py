@@ -1,7 +1,23 @@
+import asyncio
+import io
+import json
+import time
+from functools import partial
+from subprocess import CalledProcessError
+
 import pytest
+from discopy import closed, python
 
+from widip import widish
+from widip.computer import Box, Copy, Delete, Eval, Ty
+from widip.lang import Data
 from widip.loader import repl_read
-from widip.widish import SHELL_RUNNER
+from widip.trace import traced_to
+from widip.widish import (
+    ASYNC_SHELL_RUNNER, SHELL_RUNNER, FormattedOutput, Runner, ar_mapping, compile_shell_program,
+    io_ty, native_stages, run_native_pipeline, run_native_subprocess_constant,
+    run_native_subprocess_default, seq_program, widish_batch, widish_batch_main, widish_format,
+    widish_run, yaml_documents)
 
 
 @pytest.mark.parametrize(["yaml_text", "stdin", "expected"], [
@@ -16,3 +32,260 @@ def test_shell_runner(yaml_text, stdin, expected):
     fd = repl_read(yaml_text)
     constants = tuple(x.name for x in fd.dom)
     assert SHELL_RUNNER(fd)(*constants)(stdin) == expected
+
+
+def test_native_seq_streams_through_pipes():
+    printf = closed.Box("printf", closed.Ty("fmt"), io_ty)
+    sort = closed.Box("sort", closed.Ty(), io_ty)
+    seq = closed.Box("(;)", io_ty @ io_ty, io_ty)
+    with python.Function.no_type_checking:
+        program = SHELL_RUNNER(printf @ sort >> seq)("b\\na\\n")
+    assert native_stages(program) == (("printf", "b\\na\\n"), ("sort", ))
+    assert program("") == "a\nb\n"
+
+
+def test_native_pipeline_overlaps_stages():
+    # `head` exits after one line so `yes` only ends through SIGPIPE.
+    stages = (("yes", ), ("head", "-n", "1"))
+    assert run_native_pipeline(stages, "") == "y\n"
+
+
+def test_native_pipeline_raises_for_a_failing_stage():
+    with pytest.raises(CalledProcessError) as e:
+        run_native_pipeline((("sh", "-c", "cat; exit 3"), ("sort", )), "b\na\n")
+    assert (e.value.returncode, e.value.cmd, e.value.output) == (3, ("sh", "-c", "cat; exit 3"), "a\nb\n")
+    with pytest.raises(FileNotFoundError):
+        run_native_pipeline((("yes", ), ("no-such-command-widip", )), "")
+
+
+def test_native_map_runs_branches_concurrently():
+    sh = lambda: closed.Box("sh", closed.Ty("c", "script"), io_ty)
+    par = closed.Box("(||)", io_ty @ io_ty @ io_ty, io_ty @ io_ty @ io_ty)
+    scripts = ("sleep 0.5; echo a", "sleep 0.5; echo b", "echo c")
+    with python.Function.no_type_checking:
+        program = SHELL_RUNNER(sh() @ sh() @ sh() >> par)(
+            *(x for script in scripts for x in ("-c", script)))
+    start = time.monotonic()
+    assert program("") == ("a\n", "b\n", "c\n")
+    assert time.monotonic() - start < 1
+
+
+def test_async_shell_runner_shares_one_loop():
+    printf = closed.Box("printf", closed.Ty("fmt"), io_ty)
+    sort = closed.Box("sort", closed.Ty(), io_ty)
+    tr = closed.Box("tr", closed.Ty("a", "b"), io_ty)
+    seq = closed.Box("(;)", io_ty @ io_ty, io_ty)
+    par = closed.Box("(||)", io_ty @ io_ty, io_ty @ io_ty)
+    with python.Function.no_type_checking:
+        sorted_ = ASYNC_SHELL_RUNNER(printf @ sort >> seq)("b\\na\\n")
+        mapped = ASYNC_SHELL_RUNNER(sort @ tr >> par)("a-z", "A-Z")
+
+    async def main():
+        return await asyncio.gather(sorted_(""), mapped("b\na\n"))
+
+    assert asyncio.run(main()) == ["a\nb\n", ("a\nb\n", "B\nA\n")]
+
+
+def test_async_shell_runner_awaits_evaluated_programs():
+    printf = closed.Box("printf", closed.Ty("fmt"), io_ty << io_ty)
+    echo = closed.Box("echo", io_ty, io_ty)
+    diagram = printf @ io_ty >> closed.Eval(io_ty << io_ty) >> echo
+    with python.Function.no_type_checking:
+        expected = SHELL_RUNNER(diagram)("hello")("")
+        program = ASYNC_SHELL_RUNNER(diagram)("hello")
+    assert asyncio.run(program("")) == expected == "hello\n"
+
+
+@pytest.mark.parametrize("yaml_text", ["!tr {a-z: A-Z}", "- !echo a\n- !tr {a-z: A-Z}"])
+def test_async_shell_runner_matches_shell_runner(yaml_text):
+    fd = repl_read(yaml_text)
+    constants = tuple(x.name for x in fd.dom)
+    expected = SHELL_RUNNER(fd)(*constants)("b\n")
+    program = ASYNC_SHELL_RUNNER(fd)(*constants)
+
+    async def main():
+        return await program("b\n")
+
+    assert asyncio.run(main()) == expected
+
+
+def test_yaml_documents_split_as_they_end():
+    lines = iter(["# header\n", "--- !echo a\n", "- b\n", "...\n", "--- c\n", "---\n", "d\n"])
+    docs = yaml_documents(lines)
+    assert next(docs) == "# header\n--- !echo a\n- b\n...\n"
+    assert next(docs) == "--- c\n"
+    assert list(docs) == ["---\nd\n"]
+
+
+def test_yaml_documents_skip_empty_documents():
+    lines = ["---\n", "--- # nothing\n", "\n", "...\n", "--- !echo\n", "---\n"]
+    assert list(yaml_documents(lines)) == ["--- !echo\n"]
+
+
+def test_widish_stream_main_goes_on_after_a_failing_document(tmp_path, monkeypatch, capsys):
+    stream = tmp_path / "stream.yaml"
+    stream.write_text("--- a\n---\n--- [b\n--- c\n")
+    monkeypatch.setattr(widish, "widish_run", lambda fd, stdin: "ran")
+    with pytest.raises(SystemExit) as exit:
+        widish.widish_stream_main(str(stream))
+    assert exit.value.code == 1
+    assert capsys.readouterr().out == "ran\nran\n"
+
+
+def test_native_pipeline_hands_files_to_processes(tmp_path):
+    source, sink = tmp_path / "in.txt", tmp_path / "out.txt"
+    source.write_text("b\na\n")
+    with source.open() as stdin, sink.open("w") as stdout:
+        assert run_native_pipeline((("sort", ), ), stdin, stdout) is None
+    assert sink.read_text() == "a\nb\n"
+    assert run_native_pipeline((("cat", str(source)), ("sort", "-r"))) == "b\na\n"
+    assert run_native_pipeline((("tr", "a-z", "A-Z"), ), io.StringIO("a" * 10**6)) == "A" * 10**6
+
+
+def test_native_pipeline_output_keeps_widish_format():
+    stdout = io.StringIO()
+    output = FormattedOutput(stdout)
+    run_native_pipeline((("printf", "a \\n\\nb  \\n\\n"), ), "", output)
+    output.close()
+    assert stdout.getvalue() == widish_format("a \n\nb  \n\n") == "a \n\nb\n"
+
+
+def test_widish_main_hands_redirected_stdout_to_the_pipeline(tmp_path, monkeypatch):
+    printf = closed.Box("printf", closed.Ty("a \\n\\nb  \\n\\n"), io_ty)
+    monkeypatch.setattr(widish, "file_diagram", lambda file_name: printf)
+    sink = tmp_path / "out.txt"
+    with open(tmp_path / "in.txt", "w+") as stdin, sink.open("w") as stdout:
+        monkeypatch.setattr("sys.stdin", stdin)
+        monkeypatch.setattr("sys.stdout", stdout)
+        with python.Function.no_type_checking:
+            widish.widish_main("printf.yaml", draw=False)
+    assert sink.read_text() == "a \n\nb  \n\n"
+
+
+def test_trace_records_boxes_and_processes(tmp_path):
+    sh = closed.Box("sh", closed.Ty("c", "script"), io_ty)
+    wc = closed.Box("wc", closed.Ty("c"), io_ty)
+    seq = closed.Box("(;)", io_ty @ io_ty, io_ty)
+    with python.Function.no_type_checking:
+        program = SHELL_RUNNER(sh @ wc >> seq)("-c", "cat; exit 0", "-c")
+    path = tmp_path / "trace.json"
+    with traced_to(path):
+        assert program("abc") == "3\n"
+    events = json.loads(path.read_text())["traceEvents"]
+    [box] = (e for e in events if e.get("cat") == "box")
+    assert (box["name"], box["args"]["bytes_in"], box["args"]["bytes_out"]) == ("(;)", 3, 2)
+    processes = [e for e in events if e.get("cat") == "process"]
+    assert [e["name"] for e in processes] == ["sh", "wc"]
+    assert processes[0]["args"]["bytes_in"] == 3 and processes[1]["args"]["bytes_out"] == 2
+    assert all(e["args"]["exit_status"] == 0 and e["args"]["cpu_user_s"] >= 0 for e in processes)
+
+
+def test_runner_maps_each_box_once():
+    calls = []
+    runner = Runner(
+        lambda ob: partial,
+        lambda ar: calls.append(ar) or ar_mapping(ar),
+        cod=closed.Category(python.Ty, python.Function))
+    echo = lambda: closed.Box("echo", closed.Ty("x"), io_ty)
+    with python.Function.no_type_checking:
+        runner(echo() @ echo() @ echo())
+        runner(echo() @ echo() @ echo())
+        assert len(calls) == 1
+        runner.cache_clear()
+        runner(echo())
+    assert len(calls) == 2
+
+
+def test_runner_subclass_caches_each_image_once():
+    class Subrunner(Runner):
+        def __call__(self, other):
+            return super().__call__(other)
+
+    runner = Subrunner(lambda ob: partial, ar_mapping, cod=closed.Category(python.Ty, python.Function))
+    echo = closed.Box("echo", closed.Ty("x"), io_ty)
+    with python.Function.no_type_checking:
+        runner(echo)
+    # Only the outermost call remembers images, not the `Runner.__call__` it goes through.
+    assert list(runner.images) == [Subrunner.__call__.__wrapped__]
+
+
+def test_seq_program_fuses_native_chains():
+    box = lambda name, *dom: closed.Box(name, closed.Ty(*dom), io_ty)
+    seq = closed.Box("(;)", io_ty @ io_ty, io_ty)
+    printf = partial(run_native_subprocess_default, box("printf", "fmt"))
+    sort, rev = (partial(run_native_subprocess_default, box(name)) for name in ("sort", "rev"))
+    job = seq_program(seq, seq_program(seq, partial(printf, "b\\na\\n"), sort), rev)
+    assert native_stages(job) == (("printf", "b\\na\\n"), ("sort", ), ("rev", ))
+    assert job("") == "a\nb\n"
+    identity = partial(run_native_subprocess_constant, closed.Curry(closed.Id(io_ty), 1))
+    assert seq_program(seq, sort, identity) is sort
+
+
+def test_compile_shell_program_drops_no_op_structure():
+    A, B, X = Ty("A"), Ty("B"), Ty("X")
+    f, g = Box("f", A, A), Box("g", X @ A, B)
+    diagram = Copy(A) >> Delete(A) @ A >> Copy(Ty()) @ f
+    assert compile_shell_program(diagram) == f
+    assert compile_shell_program(Data(A)) == closed.Id(A)
+    assert compile_shell_program(g.curry() @ A >> Eval(B << A)) == g
+
+
+def test_widish_run_optimizes_the_program():
+    # Unoptimized, the copy and delete would run as commands.
+    A = Ty("hello")
+    diagram = Copy(A) >> Delete(A) @ A >> Box("echo", A, Ty("io"))
+    with python.Function.no_type_checking:
+        assert widish_run(diagram, "") == "hello\n"
+
+
+def test_widish_batch_runs_each_input(tmp_path):
+    paths = []
+    for i in range(4):
+        paths.append(tmp_path / f"{i}.txt")
+        paths[-1].write_text(f"input {i}\n")
+    tr = closed.Box("tr", closed.Ty("a-z", "A-Z"), io_ty)
+    with python.Function.no_type_checking:
+        results = list(widish_batch(tr, paths, jobs=2))
+    assert results == [(path, f"INPUT {i}\n") for i, path in enumerate(paths)]
+    with python.Function.no_type_checking:
+        results = widish_batch(tr, paths + [tmp_path / "missing.txt"], jobs=2, ordered=False)
+        outputs = dict(results)
+    assert outputs[paths[3]] == "INPUT 3\n"
+    assert isinstance(outputs[tmp_path / "missing.txt"], FileNotFoundError)
+
+
+def test_widish_batch_main_fails_when_an_input_fails(tmp_path, monkeypatch, capsys):
+    (tmp_path / "a.txt").write_text("input\n")
+    (tmp_path / "b.txt").mkdir()
+    tr = closed.Box("tr", closed.Ty("a-z", "A-Z"), io_ty)
+    monkeypatch.setattr(widish, "file_diagram", lambda file_name: tr)
+    with python.Function.no_type_checking, pytest.raises(SystemExit) as exit:
+        widish_batch_main("tr.yaml", str(tmp_path / "*.txt"), jobs=2)
+    assert exit.value.code == 1
+    assert capsys.readouterr().out == "INPUT\n"
+
+
+def test_cached_commands_rerun_only_changed_inputs(tmp_path, monkeypatch):
+    monkeypatch.setenv("WIDIP_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(widish, "CACHED_COMMANDS", {"sh"})
+    runs = tmp_path / "runs"
+    stages = (("sh", "-c", f"echo run >> {runs}; tr a-z A-Z"), ("rev", ))
+    assert run_native_pipeline(stages, "abc\n") == "CBA\n"
+    assert run_native_pipeline(stages, io.StringIO("abc\n")) == "CBA\n"
+    assert runs.read_text() == "run\n"
+    assert run_native_pipeline(stages, "abd\n") == "DBA\n"
+    assert runs.read_text() == "run\nrun\n"
+
+
+def test_cached_commands_key_the_files_they_read(tmp_path, monkeypatch):
+    monkeypatch.setenv("WIDIP_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(widish, "CACHED_COMMANDS", {"sh"})
+    script = tmp_path / "script.sh"
+    script.write_text("echo 3")
+    assert run_native_pipeline((("sh", str(script)), ), "") == "3\n"
+    script.write_text("echo 300")
+    assert run_native_pipeline((("sh", str(script)), ), "") == "300\n"
+    monkeypatch.setattr(widish, "CACHED_COMMANDS", {"ls"})
+    assert "new.txt" not in run_native_pipeline((("ls", str(tmp_path)), ), "")
+    (tmp_path / "new.txt").touch()
+    assert "new.txt" in run_native_pipeline((("ls", str(tmp_path)), ), "")
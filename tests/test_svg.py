@@ -0,0 +1,20 @@
+from xml.etree import ElementTree
+
+from widip.computer import Box, Copy, Ty
+from widip.svg import draw_svg
+
+
+def test_draw_svg_writes_boxes_wires_and_labels(tmp_path):
+    A, B = Ty("A"), Ty("B")
+    diagram = Box("f", A, B) >> Copy(B) >> Box("g", B, A) @ B
+    path = tmp_path / "d.svg"
+    draw_svg(diagram, str(path), fontsize_types=8)
+    svg = ElementTree.parse(path).getroot()
+    ns = "{http://www.w3.org/2000/svg}"
+    texts = [text.text for text in svg.iter(f"{ns}text")]
+    assert {"f", "g", "A", "B"} <= set(texts)
+    # The boundary, then one polygon per box.
+    assert len(list(svg.iter(f"{ns}polygon"))) == 3
+    assert len(list(svg.iter(f"{ns}circle"))) == 1
+    assert list(svg.iter(f"{ns}path"))
+    assert draw_svg(diagram, fontsize_types=8) == path.read_text()
@@ -0,0 +1,52 @@
+import time
+
+from watchdog.events import FileModifiedEvent, FileMovedEvent
+
+from widip import watch
+from widip.watch import ShellHandler, is_source
+
+
+def test_shell_handler_reloads_each_file_once_settled(monkeypatch):
+    reloaded = []
+    monkeypatch.setattr(ShellHandler, "reload", lambda self, path: reloaded.append(path))
+    handler = ShellHandler(debounce=0.1)
+    for _ in range(5):
+        handler.on_any_event(FileModifiedEvent("src/a.yaml"))
+    handler.on_any_event(FileMovedEvent("src/.b.yaml.swp", "src/b.yaml"))
+    handler.on_any_event(FileModifiedEvent("src/a.jpg"))
+    handler.on_any_event(FileModifiedEvent(".git/c.yaml"))
+    assert reloaded == []
+    time.sleep(0.5)
+    assert sorted(reloaded) == ["src/a.yaml", "src/b.yaml"]
+
+
+def test_shell_handler_keeps_reloading_after_a_failure(monkeypatch):
+    drawn = []
+    def file_diagram(path):
+        if path == "src/bad.yaml":
+            raise TypeError("bad file")
+        return path
+    monkeypatch.setattr(watch, "file_diagram", file_diagram)
+    monkeypatch.setattr(watch, "draw_async", lambda path, fd: drawn.append(fd))
+    handler = ShellHandler(debounce=0.05)
+    handler.on_any_event(FileModifiedEvent("src/bad.yaml"))
+    time.sleep(0.3)
+    handler.on_any_event(FileModifiedEvent("src/good.yaml"))
+    time.sleep(0.3)
+    assert drawn == ["src/good.yaml"] and not handler.pending
+
+
+def test_is_source_skips_outputs_and_hidden_dirs():
+    assert is_source("./examples/a.yaml")
+    assert not is_source("examples/a.jpg")
+    assert not is_source("./.venv/lib/a.yaml")
+    assert not is_source("tests/svg/a.yaml")
+
+
+def test_shell_handler_stops_reloading(monkeypatch):
+    reloaded = []
+    monkeypatch.setattr(ShellHandler, "reload", lambda self, path: reloaded.append(path))
+    handler = ShellHandler(debounce=0.1)
+    handler.on_any_event(FileModifiedEvent("src/a.yaml"))
+    handler.stop()
+    assert not handler.reloader.is_alive() and reloaded == []
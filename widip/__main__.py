@@ -2,12 +2,6 @@ import sys
 import argparse
 import logging
 
-# Stop starting a Matplotlib GUI
-import matplotlib
-matplotlib.use('agg')
-
-from .watch import shell_main, widish_main
-
 def build_arguments(args):
     parser = argparse.ArgumentParser()
 
@@ -21,12 +15,51 @@ def build_arguments(args):
         action="store_true",
         help="Enable verbose output"
     )
+    parser.add_argument(
+        "-s", "--stream",
+        action="store_true",
+        help="Run each YAML document as soon as it arrives, from stdin if no file is given"
+    )
+    parser.add_argument(
+        "--inputs",
+        metavar="GLOB",
+        help="Run the program once per matching file, with the file as stdin"
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        help="Number of worker processes for --inputs, defaults to the CPU count"
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="Write --inputs results as they complete instead of in input order"
+    )
+    parser.add_argument(
+        "--cache-commands",
+        metavar="CMD,...",
+        help="Cache the output of these deterministic commands by argv, input and environment"
+    )
+    parser.add_argument(
+        "--daemon",
+        nargs="?",
+        const="",
+        metavar="SOCKET",
+        help="Serve runs from widip.client over a Unix socket, see widip/client.py"
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="OUT_JSON",
+        help="Write a Chrome trace of every executed box and process to this file"
+    )
     parser.add_argument(
         "file_name",
         nargs="?",
         help="The yaml file to run, if not provided it will start a shell"
     )
     args = parser.parse_args(args)
+    if args.inputs and args.file_name is None:
+        parser.error("--inputs needs a program file")
     return args
 
 
@@ -41,10 +74,33 @@ def main(argv):
 
     logging.debug(f"running \"{args.file_name}\" file with no-draw={args.no_draw}")
 
-    if args.file_name is None:
+    if args.trace:
+        from .trace import traced_to
+        with traced_to(args.trace):
+            dispatch(args, draw)
+    else:
+        dispatch(args, draw)
+
+def dispatch(args, draw):
+    if args.cache_commands:
+        from .widish import CACHED_COMMANDS
+        CACHED_COMMANDS.update(filter(None, args.cache_commands.split(",")))
+    # Deferred so that running a file doesn't import watchdog.
+    if args.daemon is not None:
+        from .daemon import daemon_main
+        daemon_main(args.daemon)
+    elif args.stream:
+        from .widish import widish_stream_main
+        widish_stream_main(args.file_name)
+    elif args.inputs:
+        from .widish import widish_batch_main
+        widish_batch_main(args.file_name, args.inputs, args.jobs, not args.unordered)
+    elif args.file_name is None:
+        from .watch import shell_main
         logging.debug("Starting shell")
         shell_main("bin/yaml/shell.yaml", draw)
     else:
+        from .widish import widish_main
         widish_main(args.file_name, draw)
 
 if __name__ == "__main__":
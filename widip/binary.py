@@ -0,0 +1,287 @@
+"""
+Compact binary format for diagrams, loaded straight from a buffer or memory-mapped file.
+
+A file is a header followed by flat little-endian arrays:
+a string table, a class table, one table per kind of object and a table of generic values.
+Each object record is its class, the value of its attributes and, for types, layers and diagrams,
+a range of a flat array listing its objects, layers or boxes and types.
+Tables are read in place, loading then builds every object reachable from the root once,
+sharing it wherever it is referred to again.
+
+Classes are stored by name and generic values may be pickled. Loading only resolves the
+widip and discopy diagram classes and builtin value types in `find_class`, still, like pickles,
+only load files from trusted sources.
+"""
+from array import array
+import builtins
+from importlib import import_module
+import io
+import mmap
+import pickle
+import struct
+import sys
+
+from discopy import cat, closed, monoidal
+
+
+MAGIC = b"WIDIPDG\0"
+VERSION = 1
+# Sections in file order with their array typecodes.
+SECTIONS = (
+    ("string_offsets", "Q"), ("strings", "B"), ("classes", "I"),
+    ("value_tags", "B"), ("value_data", "q"), ("slots", "I"),
+    ("obs", "I"), ("types", "I"), ("type_obs", "I"), ("boxes", "I"),
+    ("layers", "I"), ("layer_items", "I"), ("diagrams", "I"), ("diagram_layers", "I"))
+HEADER = struct.Struct(f"<8sII{len(SECTIONS)}I")
+
+# Value tags, composite values point into `slots`: a length then the item values.
+NONE, FALSE, TRUE, INT, FLOAT, STR, BYTES, TUPLE, LIST, DICT, CLASS, PICKLE, \
+    OB, TY, BOX, LAYER, DIAGRAM = range(17)
+# Object tables: the record width and the attribute kept in a flat array.
+TABLES = {
+    OB: ("obs", 2, None, None),
+    TY: ("types", 4, "inside", "type_obs"),
+    BOX: ("boxes", 2, None, None),
+    LAYER: ("layers", 4, "boxes_or_types", "layer_items"),
+    DIAGRAM: ("diagrams", 4, "inside", "diagram_layers")}
+# Classes a file can name besides widip and discopy objects, types, boxes, layers and diagrams.
+VALUE_CLASSES = (
+    bool, int, float, complex, str, bytes, bytearray, tuple, list, dict, set, frozenset,
+    slice, range, type(None))
+
+
+def dumps(diagram) -> bytes:
+    return Writer().write(diagram)
+
+def dump(diagram, path):
+    with open(path, "wb") as file:
+        file.write(dumps(diagram))
+
+def loads(data):
+    """The diagram in data, any buffer such as bytes or an mmap."""
+    return Reader(data).root()
+
+def load(path):
+    """The diagram in the file at path, its tables read through a memory map."""
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(data)
+
+
+def find_class(module, name):
+    """
+    The class module.name when it is a widip or discopy diagram class or one of `VALUE_CLASSES`.
+    Files and their pickled values can't name, and so call, any other class or function.
+    """
+    obj = None
+    if module == "builtins":
+        obj = getattr(builtins, name, None)
+        if obj in VALUE_CLASSES:
+            return obj
+    elif module.split(".")[0] in ("widip", "discopy"):
+        obj = import_module(module)
+        for part in name.split("."):
+            obj = getattr(obj, part, None)
+        # By the class's own module, widip and discopy modules import others' classes.
+        if isinstance(obj, type) and issubclass(obj, (cat.Ob, cat.Arrow)) \
+                and obj.__module__.split(".")[0] in ("widip", "discopy"):
+            return obj
+    raise ValueError(f"{module}:{name} is not a diagram class or a builtin value type")
+
+class Unpickler(pickle.Unpickler):
+    """Unpickles generic values, with the classes `find_class` allows."""
+    def find_class(self, module, name):
+        return find_class(module, name)
+
+
+def object_tag(obj):
+    """The table of a discopy object, `None` for other values."""
+    if isinstance(obj, closed.Exp):
+        # An exponential is a type made of itself as single object.
+        return OB
+    if isinstance(obj, monoidal.Ty):
+        return TY
+    if isinstance(obj, monoidal.Layer):
+        return LAYER
+    if isinstance(obj, monoidal.Box):
+        return BOX
+    if isinstance(obj, monoidal.Diagram):
+        return DIAGRAM
+    if isinstance(obj, cat.Ob):
+        return OB
+    return None
+
+
+class Writer:
+    """Appends each object once to its table, the same object is always the same entry."""
+    def __init__(self):
+        self.arrays = {name: array(code) for name, code in SECTIONS}
+        self.arrays["string_offsets"].append(0)
+        self.indices = {}
+        # Keeps the objects indexed by id alive while writing.
+        self.seen = []
+
+    def write(self, diagram) -> bytes:
+        root = self.value(diagram)
+        if sys.byteorder != "little":
+            for a in self.arrays.values():
+                a.byteswap()
+        # Sections follow each other, each padded to 8 bytes so it casts in place.
+        chunks = [HEADER.pack(MAGIC, VERSION, root, *(len(self.arrays[name]) for name, _ in SECTIONS))]
+        chunks += (self.arrays[name].tobytes() for name, _ in SECTIONS)
+        return b"".join(chunk + bytes(-len(chunk) % 8) for chunk in chunks)
+
+    def index(self, table, key, add):
+        """The index of key in table, calling add to append its record the first time."""
+        try:
+            return self.indices[table, key]
+        except KeyError:
+            i = self.indices[table, key] = add()
+            return i
+
+    def string(self, data: bytes):
+        def add():
+            self.arrays["strings"].frombytes(data)
+            offsets = self.arrays["string_offsets"]
+            offsets.append(offsets[-1] + len(data))
+            return len(offsets) - 2
+        return self.index("strings", data, add)
+
+    def cls(self, cls):
+        name = f"{cls.__module__}:{cls.__qualname__}".encode()
+        def add():
+            self.arrays["classes"].append(self.string(name))
+            return len(self.arrays["classes"]) - 1
+        return self.index("classes", name, add)
+
+    def object(self, tag, obj):
+        table, width, field, items = TABLES[tag]
+        # Equal objects and types are the same, diagrams often repeat them as distinct objects.
+        key = (table, type(obj), obj) if tag in (OB, TY) else (table, id(obj))
+        if key in self.indices:
+            return self.indices[key]
+        # Indexed before its attributes, which can refer back to it, e.g. a box is in its own layer.
+        records = self.arrays[table]
+        i = self.indices[key] = len(records) // width
+        self.seen.append(obj)
+        records.extend([0] * width)
+        state = dict(obj.__getstate__() or {})
+        record = [self.cls(type(obj))]
+        if field is not None:
+            ids = [self.object(object_tag(x), x) for x in state.pop(field)]
+            record += [len(self.arrays[items]), len(ids)]
+            self.arrays[items].extend(ids)
+        record.insert(1, self.value(state))
+        records[width * i:width * (i + 1)] = array("I", record)
+        return i
+
+    def value(self, obj):
+        """Appends a value, objects go to their tables and anything else unknown is pickled."""
+        tag = object_tag(obj)
+        if tag is not None:
+            data = self.object(tag, obj)
+        elif obj is None or obj is False or obj is True:
+            tag, data = {None: NONE, False: FALSE, True: TRUE}[obj], 0
+        elif type(obj) is int and -2**63 <= obj < 2**63:
+            tag, data = INT, obj
+        elif type(obj) is float:
+            tag, data = FLOAT, struct.unpack("<q", struct.pack("<d", obj))[0]
+        elif type(obj) is str:
+            tag, data = STR, self.string(obj.encode())
+        elif type(obj) is bytes:
+            tag, data = BYTES, self.string(obj)
+        elif type(obj) in (tuple, list):
+            tag, data = TUPLE if type(obj) is tuple else LIST, self.slots([self.value(x) for x in obj])
+        elif type(obj) is dict and all(type(key) is str for key in obj):
+            tag, data = DICT, self.slots([v for item in obj.items() for v in map(self.value, item)])
+        elif isinstance(obj, type):
+            tag, data = CLASS, self.cls(obj)
+        else:
+            tag, data = PICKLE, self.string(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+        def add():
+            self.arrays["value_tags"].append(tag)
+            self.arrays["value_data"].append(data)
+            return len(self.arrays["value_tags"]) - 1
+        # Equal values are stored once, e.g. the attributes many boxes have in common.
+        return self.index("values", (tag, data), add)
+
+    def slots(self, items):
+        def add():
+            slots = self.arrays["slots"]
+            slots.append(len(items))
+            slots.extend(items)
+            return len(slots) - len(items) - 1
+        return self.index("slots", tuple(items), add)
+
+
+class Reader:
+    """
+    Views each section of data in place and builds each object once, the first time it is reached.
+    The data, e.g. an mmap, is kept open as long as the reader is alive.
+    """
+    def __init__(self, data):
+        magic, version, self.root_value, *lengths = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a widip diagram file of version {VERSION}")
+        if sys.byteorder != "little":
+            raise ValueError("widip diagram files are little-endian")
+        view, offset = memoryview(data), HEADER.size + -HEADER.size % 8
+        for (name, code), length in zip(SECTIONS, lengths):
+            size = array(code).itemsize * length
+            setattr(self, name, view[offset:offset + size].cast(code))
+            offset += size + -size % 8
+        self.objects, self.loaded_classes = {}, {}
+
+    def root(self):
+        return self.value(self.root_value)
+
+    def string(self, i) -> bytes:
+        return bytes(self.strings[self.string_offsets[i]:self.string_offsets[i + 1]])
+
+    def cls(self, i):
+        if i not in self.loaded_classes:
+            self.loaded_classes[i] = find_class(*self.string(self.classes[i]).decode().split(":"))
+        return self.loaded_classes[i]
+
+    def object(self, tag, i):
+        key = tag, i
+        if key in self.objects:
+            return self.objects[key]
+        table, width, field, items = TABLES[tag]
+        record = getattr(self, table)[width * i:width * (i + 1)]
+        # Without calling __new__ and __init__, like unpickling.
+        obj = self.objects[key] = object.__new__(self.cls(record[0]))
+        # Not __setstate__, discopy's reads old pickles without inside.
+        obj.__dict__.update(self.value(record[1]))
+        if field is not None:
+            start, length = record[2:]
+            ids = getattr(self, items)[start:start + length]
+            if tag == LAYER:
+                obj.__dict__[field] = tuple(
+                    self.object(TY if j % 2 == 0 else BOX, x) for j, x in enumerate(ids))
+            else:
+                obj.__dict__[field] = tuple(self.object(OB if tag == TY else LAYER, x) for x in ids)
+        return obj
+
+    def value(self, i):
+        tag, data = self.value_tags[i], self.value_data[i]
+        if tag in TABLES:
+            return self.object(tag, data)
+        if tag in (NONE, FALSE, TRUE):
+            return (None, False, True)[tag]
+        if tag == INT:
+            return data
+        if tag == FLOAT:
+            return struct.unpack("<d", struct.pack("<q", data))[0]
+        if tag == STR:
+            return self.string(data).decode()
+        if tag == BYTES:
+            return self.string(data)
+        if tag in (TUPLE, LIST, DICT):
+            items = [self.value(x) for x in self.slots[data + 1:data + 1 + self.slots[data]]]
+            if tag == DICT:
+                return dict(zip(items[::2], items[1::2]))
+            return tuple(items) if tag == TUPLE else items
+        if tag == CLASS:
+            return self.cls(data)
+        return Unpickler(io.BytesIO(self.string(data))).load()
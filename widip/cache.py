@@ -0,0 +1,89 @@
+"""Content-addressed on-disk caches under `$XDG_CACHE_HOME/widip`."""
+
+from functools import cache
+import hashlib
+import os
+import pickle
+import zlib
+from pathlib import Path
+
+
+# Bump when the cached representation changes.
+CACHE_VERSION = b"1"
+# Modules deciding what a source loads to and defining the classes cached diagrams pickle.
+CODE_MODULES = ("loader.py", "computer.py", "lang.py")
+# Diagram entries are small, a few MB keep every program of a working tree.
+DIAGRAM_CACHE_BYTES = 32 * 2**20
+# Command outputs can be big, keep the most recent ones.
+RESULT_CACHE_BYTES = 256 * 2**20
+# Drawing entries only remember which diagram each image shows.
+DRAWING_CACHE_BYTES = 2**20
+
+
+def cache_dir(kind):
+    root = os.environ.get("WIDIP_CACHE_DIR") \
+        or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "widip"
+    return Path(root) / kind
+
+@cache
+def code_version() -> bytes:
+    """The discopy version and widip code entries depend on, so upgrades never load stale ones."""
+    import discopy
+    h = hashlib.sha256(discopy.__version__.encode())
+    for name in CODE_MODULES:
+        h.update((Path(__file__).parent / name).read_bytes())
+    return h.digest()
+
+def content_key(*parts: bytes):
+    h = hashlib.sha256(CACHE_VERSION + code_version())
+    for part in parts:
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+def cache_load(kind, key):
+    """The object stored under key or `None` on a miss or an unreadable entry."""
+    path = cache_dir(kind) / key
+    try:
+        obj = pickle.loads(zlib.decompress(path.read_bytes()))
+    except (OSError, zlib.error, pickle.UnpicklingError, EOFError, AttributeError, TypeError):
+        return None
+    # Touch for LRU eviction.
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return obj
+
+def cache_store(kind, key, obj, max_bytes):
+    """Best-effort store of obj, objects that don't pickle are not cached."""
+    try:
+        data = zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+        return
+    directory = cache_dir(kind)
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrent readers never see partial entries.
+        tmp = directory / f".{key}.{os.getpid()}"
+        tmp.write_bytes(data)
+        tmp.replace(directory / key)
+    except OSError:
+        return
+    cache_evict(kind, max_bytes)
+
+def cache_evict(kind, max_bytes):
+    """Removes least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for path in cache_dir(kind).iterdir():
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
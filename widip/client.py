@@ -0,0 +1,68 @@
+"""
+Thin client for the widip daemon, it only imports the standard library.
+
+    python -m widip --daemon &
+    python -m widip.client -n file.yaml < input
+
+The daemon runs the arguments with our working directory, environment,
+stdin, stdout and stderr and we exit with its status.
+Without a daemon listening, e.g. after it was killed, we run `python -m widip` instead.
+The socket lives in a directory only we can open and we only talk to a daemon run by us.
+"""
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+
+
+def default_socket_path():
+    if os.environ.get("WIDIP_SOCKET"):
+        return os.environ["WIDIP_SOCKET"]
+    runtime = os.environ.get("XDG_RUNTIME_DIR") \
+        or private_dir(os.path.join(tempfile.gettempdir(), f"widip-{os.getuid()}"))
+    return os.path.join(runtime, f"widip-{os.getuid()}.sock")
+
+def private_dir(path):
+    """path as a directory only we can open, refusing one someone else made first."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} is not a private directory of this user")
+    return path
+
+def peer_uid(sock):
+    """The user id of the process at the other end of sock, `None` where the OS doesn't tell."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+def client_main(argv, socket_path=None):
+    """Runs argv in the daemon, returning its exit status, or in this process when none listens."""
+    request = json.dumps({"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}).encode()
+    with socket.socket(socket.AF_UNIX) as sock:
+        try:
+            sock.connect(socket_path or default_socket_path())
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.execv(sys.executable, [sys.executable, "-m", "widip", *argv])
+        if peer_uid(sock) not in (None, os.getuid()):
+            print("widip: the daemon socket is served by another user", file=sys.stderr)
+            return 1
+        # The descriptors travel with the first bytes of the request.
+        socket.send_fds(sock, [len(request).to_bytes(4, "big") + request], [0, 1, 2])
+        status = b""
+        while len(status) < 4:
+            chunk = sock.recv(4 - len(status))
+            if not chunk:
+                return 1
+            status += chunk
+    return int.from_bytes(status, "big", signed=True)
+
+if __name__ == "__main__":
+    sys.exit(client_main(sys.argv[1:]))
@@ -0,0 +1,160 @@
+"""
+Columnar diagrams: the layers of a diagram as typed arrays of box ids and wire offsets,
+with each distinct box stored once and the types of each layer left implicit.
+"""
+from array import array
+
+from discopy import monoidal
+from discopy.utils import AxiomError
+
+
+class ColumnarDiagram:
+    """
+    A diagram as columns, layer `i` has the boxes `box_ids[layer_offsets[i]:layer_offsets[i + 1]]`
+    at the wire offsets `box_offsets` in its domain, the wires around them follow from `dom`.
+    Building one with `append` and `extend` never builds the types of the layers,
+    the caller sets `cod` once it is done.
+    """
+    def __init__(self, factory, layer_factory, dom, cod, boxes=()):
+        self.factory, self.layer_factory, self.dom, self.cod = factory, layer_factory, dom, cod
+        self.boxes = list(boxes)
+        self.layer_offsets, self.box_ids, self.box_offsets = array("I", [0]), array("I"), array("I")
+        self.box_index = {(type(box), box): i for i, box in enumerate(self.boxes)}
+
+    @classmethod
+    def from_diagram(cls, diagram):
+        columns = cls(diagram.factory, diagram.layer_factory, diagram.dom, diagram.cod)
+        for layer in diagram.inside:
+            offset = 0
+            for i, box_or_typ in enumerate(layer.boxes_or_types):
+                if i % 2 == 0:
+                    offset += len(box_or_typ)
+                    continue
+                columns.box_ids.append(columns.box_id(box_or_typ))
+                columns.box_offsets.append(offset)
+                offset += len(box_or_typ.dom)
+            columns.layer_offsets.append(len(columns.box_ids))
+        return columns
+
+    @classmethod
+    def cast(cls, diagram):
+        return diagram if isinstance(diagram, cls) else cls.from_diagram(diagram)
+
+    @classmethod
+    def tensor_all(cls, diagrams):
+        """`diagrams[0] @ ... @ diagrams[-1]`, copying each column once."""
+        first, *rest = diagrams
+        dom = first.dom.tensor(*(d.dom for d in rest)) if rest else first.dom
+        cod = first.cod.tensor(*(d.cod for d in rest)) if rest else first.cod
+        columns, width = cls(first.factory, first.layer_factory, dom, cod), 0
+        for d in diagrams:
+            columns.extend(d, width)
+            width += len(d.cod)
+        return columns
+
+    def append(self, box, offset):
+        """Appends a layer with box at offset."""
+        self.box_ids.append(self.box_id(box))
+        self.box_offsets.append(offset)
+        self.layer_offsets.append(len(self.box_ids))
+
+    def extend(self, other, offset):
+        """Appends the layers of other with `offset` wires on their left."""
+        ids = [self.box_id(box) for box in other.boxes]
+        start = len(self.box_ids)
+        self.box_ids.extend(ids[i] for i in other.box_ids)
+        self.box_offsets.extend(o + offset for o in other.box_offsets)
+        self.layer_offsets.extend(o + start for o in other.layer_offsets[1:])
+
+    def copy(self, dom=None, cod=None):
+        columns = type(self)(
+            self.factory, self.layer_factory,
+            self.dom if dom is None else dom, self.cod if cod is None else cod)
+        columns.boxes, columns.box_index = list(self.boxes), dict(self.box_index)
+        columns.layer_offsets, columns.box_ids, columns.box_offsets \
+            = array("I", self.layer_offsets), array("I", self.box_ids), array("I", self.box_offsets)
+        return columns
+
+    def then(self, other):
+        other = self.cast(other)
+        if self.cod != other.dom:
+            raise AxiomError(f"{self} does not compose with {other}: {self.cod} != {other.dom}.")
+        columns = self.copy(cod=other.cod)
+        columns.extend(other, 0)
+        return columns
+
+    def tensor(self, other):
+        if isinstance(other, monoidal.Ty):
+            return self.copy(dom=self.dom @ other, cod=self.cod @ other)
+        return self.tensor_all([self, self.cast(other)])
+
+    def __rshift__(self, other):
+        return self.then(other)
+
+    def __matmul__(self, other):
+        return self.tensor(other)
+
+    def __rmatmul__(self, other):
+        """`other @ self` for a type other, shifting every box to the right."""
+        columns = self.copy(dom=other @ self.dom, cod=other @ self.cod)
+        columns.box_offsets = array("I", (o + len(other) for o in self.box_offsets))
+        return columns
+
+    def box_id(self, box):
+        # Keyed by type, equal boxes of different classes map differently.
+        i = self.box_index.setdefault((type(box), box), len(self.boxes))
+        if i == len(self.boxes):
+            self.boxes.append(box)
+        return i
+
+    def __len__(self):
+        return len(self.layer_offsets) - 1
+
+    def __repr__(self):
+        return f"ColumnarDiagram({self.dom!r}, {self.cod!r}, {len(self)} layers)"
+
+    def layers(self):
+        """
+        Yields the box ids of each layer and the types around them,
+        building the types from the wires before the layer.
+        """
+        ty, wires = self.dom.factory, self.dom.inside
+        for i in range(len(self)):
+            box_ids, types, cod, start = [], [], [], 0
+            for j in range(self.layer_offsets[i], self.layer_offsets[i + 1]):
+                box, offset = self.boxes[self.box_ids[j]], self.box_offsets[j]
+                box_ids.append(self.box_ids[j])
+                types.append(ty(*wires[start:offset]))
+                cod += wires[start:offset] + box.cod.inside
+                start = offset + len(box.dom)
+            types.append(ty(*wires[start:]))
+            wires = tuple(cod) + wires[start:]
+            yield box_ids, types
+
+    def to_diagram(self):
+        inside = []
+        for box_ids, types in self.layers():
+            items = [types[0]]
+            for box_id, typ in zip(box_ids, types[1:]):
+                items += [self.boxes[box_id], typ]
+            inside.append(self.layer_factory(*items))
+        return self.factory(tuple(inside), self.dom, self.cod, _scan=False)
+
+    def map(self, functor):
+        """
+        Composes the images of each layer by functor like discopy functors do,
+        mapping each distinct box once and without building the layers.
+        """
+        boxes, result = list(map(functor, self.boxes)), None
+        for box_ids, types in self.layers():
+            layer = functor(types[0])
+            for box_id, typ in zip(box_ids, types[1:]):
+                layer = layer @ boxes[box_id] @ functor(typ)
+            # Starting from the first layer, its category can be more specific than functor.cod.
+            result = layer if result is None else result >> layer
+        return functor.cod.ar.id(functor(self.dom)) if result is None else result
+
+    @property
+    def nbytes(self):
+        """Size of the columns, without the distinct boxes."""
+        return sum(a.itemsize * len(a) for a in (self.layer_offsets, self.box_ids, self.box_offsets))
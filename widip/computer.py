@@ -1,5 +1,7 @@
 """Section 2.5 monoidal-computer core and Run-language primitives."""
 
+from functools import lru_cache, partial, wraps
+
 from discopy import closed, markov, monoidal
 from discopy.utils import factory
 
@@ -16,7 +18,7 @@ class Ty(closed.Ty):
 
     def tensor(self, *others):
         # Preserve distinguished subtypes when tensoring with the monoidal unit.
-        if len(others) == 1:
+        if len(others) == 1 and isinstance(others[0], closed.Ty):
             other = others[0]
             if len(self) == 0:
                 return other
@@ -37,7 +39,40 @@ class Diagram(markov.Diagram):
         # Fix exponential type drawing recursion.
         return markov.Diagram.to_drawing(self, functor_factory=closed.Functor)
 
-class Functor(markov.Functor, closed.Functor):
+class Memoized:
+    """
+    Functor mixin remembering the images of types, boxes and whole diagrams,
+    so a box seen many times or a diagram compiled again is only mapped once.
+    Each functor keeps at most `cache_size` images, least recently used first out,
+    only its most derived `__call__` remembers them.
+    Call `cache_clear` after changing the `ob` or `ar` mappings.
+    """
+    cache_size = 2**12
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "__call__" in cls.__dict__ or Memoized in cls.__bases__:
+            cls.__call__ = memoized_call(cls.__call__)
+
+    def cache_clear(self):
+        for images in self.__dict__.get("images", {}).values():
+            images.cache_clear()
+
+def memoized_call(call):
+    @wraps(call)
+    def __call__(self, other):
+        if type(self).__call__ is not __call__:
+            # Called through `super()` from the call of a subclass, which already remembers the image.
+            return call(self, other)
+        images = self.__dict__.setdefault("images", {})
+        if call not in images:
+            # Equal objects of different types can have different images, e.g. Ty and closed.Ty.
+            images[call] = lru_cache(self.cache_size, typed=True)(partial(call, self))
+        return images[call](other)
+    return __call__
+
+
+class Functor(Memoized, markov.Functor, closed.Functor):
     """
     Preserves markov, closed, and computer boxes.
     """
@@ -0,0 +1,97 @@
+"""
+Daemon keeping the interpreter, its imports and caches warm for `widip.client`.
+
+Each request is served in a process forked from the daemon,
+so it starts with everything imported and can't affect the next requests.
+Requests run any argv in any environment, so only our user can connect.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import traceback
+
+from .client import default_socket_path, peer_uid
+
+
+class DaemonServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    def server_bind(self):
+        super().server_bind()
+        # Before listening, no one could connect yet.
+        os.chmod(self.server_address, 0o600)
+
+    def verify_request(self, request, client_address):
+        return peer_uid(request) in (None, os.getuid())
+
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        message, fds, _, _ = socket.recv_fds(self.request, 2**16, 3)
+        if not message:
+            # A connection checking that we listen, see `is_listening`.
+            return
+        size = int.from_bytes(message[:4], "big")
+        message = message[4:]
+        while len(message) < size:
+            chunk = self.request.recv(size - len(message))
+            if not chunk:
+                return
+            message += chunk
+        status = serve_request(json.loads(message), fds)
+        self.request.sendall(status.to_bytes(4, "big", signed=True))
+
+
+def serve_request(request, fds):
+    """Runs the request's argv on its descriptors, in this already forked process."""
+    from .__main__ import main
+
+    for fd, std in zip(fds, (0, 1, 2)):
+        os.dup2(fd, std)
+        os.close(fd)
+    sys.stdin = open(0, closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", buffering=1, closefd=False)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    # Log to the client's stderr.
+    logging.root.handlers.clear()
+    try:
+        main(["widip", *request["argv"]])
+        status = 0
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return status
+
+def is_listening(socket_path):
+    with socket.socket(socket.AF_UNIX) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+def daemon_main(socket_path=None):
+    socket_path = socket_path or default_socket_path()
+    # Warm up everything a run can import.
+    from . import files, loader, widish
+    import matplotlib.pyplot
+    if is_listening(socket_path):
+        logging.error(f"a widip daemon is already listening on {socket_path}")
+        sys.exit(1)
+    if os.path.exists(socket_path):
+        # Left by a daemon that was killed.
+        os.unlink(socket_path)
+    with DaemonServer(socket_path, RequestHandler) as server:
+        logging.info(f"widip daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
@@ -1,8 +1,13 @@
+import mmap
+import os
 import pathlib
 
+import matplotlib
 from discopy.closed import Ty, Diagram, Box, Id, Functor
 
-from .loader import repl_read
+from .cache import DIAGRAM_CACHE_BYTES, DRAWING_CACHE_BYTES, cache_load, cache_store, content_key
+from .loader import event_read
+from .svg import draw_svg
 
 
 def files_ar(ar: Box) -> Diagram:
@@ -17,16 +22,67 @@ def files_ar(ar: Box) -> Diagram:
         return ar
 
 def file_diagram(file_name) -> Diagram:
+    """Loads a YAML file memory-mapped, hashing and parsing read it in place."""
     path = pathlib.Path(file_name)
-    fd = repl_read(path.open())
+    with path.open("rb") as file:
+        try:
+            source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files and pipes can't be mapped.
+            fd = source_diagram(file.read())
+        else:
+            with source:
+                fd = source_diagram(source)
     # TODO TypeError: Expected closed.Diagram, got monoidal.Diagram instead
     # fd = replace_id_f(path.stem)(fd)
     return fd
 
+def source_diagram(source: bytes) -> Diagram:
+    """Loads YAML source, bytes or a memory map, through the diagram cache keyed by its bytes."""
+    key = content_key(source)
+    fd = cache_load("diagrams", key)
+    if fd is None:
+        fd = event_read(source)
+        cache_store("diagrams", key, fd, DIAGRAM_CACHE_BYTES)
+    return fd
+
+DRAW_PARAMS = {"textpad": (0.3, 0.1), "fontsize": 12, "fontsize_types": 8}
+# "svg" skips Matplotlib and writes the drawing directly, fast enough for every save.
+DRAW_FORMAT = os.environ.get("WIDIP_DRAW_FORMAT", "jpg")
+
 def diagram_draw(path, fd):
-    fd.draw(path=str(path.with_suffix(".jpg")),
-            textpad=(0.3, 0.1),
-            fontsize=12,
-            fontsize_types=8)
+    """Draws fd next to path, unless the image there already shows an equal diagram."""
+    image = path.with_suffix(f".{DRAW_FORMAT}")
+    key = drawing_key(fd, DRAW_PARAMS)
+    if drawn_key(image) == key:
+        return
+    if DRAW_FORMAT == "svg":
+        draw_svg(fd, str(image), **DRAW_PARAMS)
+    else:
+        # Never a GUI backend, only here so that the programs we run keep the user's MPLBACKEND.
+        matplotlib.use("agg")
+        fd.draw(path=str(image), **DRAW_PARAMS)
+    stat = image.stat()
+    cache_store("drawings", content_key(str(image.resolve()).encode()),
+                (key, stat.st_mtime_ns, stat.st_size), DRAWING_CACHE_BYTES)
+
+def is_drawn(path, fd):
+    """Whether the image next to path already shows fd, `diagram_draw` would do nothing."""
+    return drawn_key(path.with_suffix(f".{DRAW_FORMAT}")) == drawing_key(fd, DRAW_PARAMS)
+
+def drawing_key(fd, params):
+    """Structural hash of a drawing, the repr of a diagram spells out its boxes and types."""
+    return content_key(repr(fd).encode(), repr(sorted(params.items())).encode())
+
+def drawn_key(image):
+    """The `drawing_key` of the image, `None` when it is missing or was changed since."""
+    entry = cache_load("drawings", content_key(str(image.resolve()).encode()))
+    try:
+        stat = image.stat()
+    except OSError:
+        return None
+    if entry is None or entry[1:] != (stat.st_mtime_ns, stat.st_size):
+        return None
+    return entry[0]
 
 files_f = Functor(lambda x: Ty(""), files_ar)
@@ -108,7 +108,7 @@ class Data(monoidal.Bubble, computer.Box):
 
 
 
-class Compile(closed.Functor, markov.Functor):
+class Compile(computer.Memoized, closed.Functor, markov.Functor):
     """Pure diagram compilation of custom boxes into closed+markov structure."""
 
     dom = computer.Category()
@@ -1,9 +1,12 @@
-from itertools import batched
+from itertools import batched, chain
+import yaml
 from nx_yaml import nx_compose_all, nx_serialize_all
 from nx_hif.hif import *
 
 from discopy.closed import Eval, Curry
+from discopy.utils import assert_isinstance
 
+from .columnar import ColumnarDiagram
 from .computer import Box, Id, Ty
 
 
@@ -11,47 +14,300 @@ P = Ty("io") >> Ty("io")
 
 
 def repl_read(stream):
+    """Loads the diagram of a YAML stream with `event_read`, nesting depth is only limited by memory."""
+    return event_read(stream)
+
+def hif_read(stream):
+    """Loads through the nx_yaml hypergraph, composing it recurses once per nesting level."""
     incidences = nx_compose_all(stream)
     diagrams = incidences_to_diagram(incidences)
     return diagrams
 
 def incidences_to_diagram(node: HyperGraph):
     # TODO properly skip stream and document start
-    diagram = _incidences_to_diagram(node, 0)
+    diagram = _incidences_to_diagram(node, 0, hif_incidence_index(node))
     return diagram
 
-def _incidences_to_diagram(node: HyperGraph, index):
+def event_read(stream):
+    """
+    Loads the same diagram as `hif_read` straight from the PyYAML event stream,
+    without building the nx_yaml hypergraph. Uses libyaml when available.
+    """
+    return events_to_diagram(yaml.parse(stream, Loader=EventLoader))
+
+def columnar_read(stream):
+    """
+    `event_read` into a `ColumnarDiagram`, the loader appends each box to its columns
+    so that the layers of the whole diagram are never built.
+    """
+    return events_to_diagram(yaml.parse(stream, Loader=EventLoader), ColumnarDiagram.cast)
+
+EventLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+def events_to_diagram(events, cast=lambda diagram: diagram):
+    """
+    Builds diagrams as collections end, keeping only the open collections
+    and their finished children in memory. Every diagram built goes through `cast`.
+    """
+    frames = []
+    ob = cast(Id())
+    for event in events:
+        tag = (getattr(event, "tag", None) or "")[1:]
+        match event:
+            case yaml.StreamStartEvent():
+                frames.append(("stream", tag, []))
+            case yaml.DocumentStartEvent():
+                frames.append(("document", tag, []))
+            case yaml.SequenceStartEvent():
+                frames.append(("sequence", tag, []))
+            case yaml.MappingStartEvent():
+                frames.append(("mapping", tag, []))
+            case yaml.ScalarEvent():
+                frames[-1][2].append(cast(load_scalar(event.value, tag)))
+            case yaml.AliasEvent():
+                raise Exception("Kind \"alias\" doesn't match any.")
+            case _:
+                kind, tag, args = frames.pop()
+                ob = cast(load_kind(kind, tag, args))
+                if frames:
+                    frames[-1][2].append(ob)
+    return ob
+
+def hif_incidence_index(node: HyperGraph):
+    """
+    Head incidences of every node and edge grouped by incidence key in one pass,
+    so that following `next`, `start` and `forward` is a dict lookup.
+    """
+    V, E, I = node
+    kinds = {V.graph["incidence_pair_index"]: "node", E.graph["incidence_pair_index"]: "edge"}
+    index = {}
+    for (ee0, ee1, k, d) in I.edges(data=True, keys=True):
+        if d["direction"] != "head":
+            continue
+        index.setdefault((kinds[ee0[1]], ee0[0], k), []).append(ee1[0])
+        index.setdefault((kinds[ee1[1]], ee1[0], k), []).append(ee0[0])
+    return index
+
+def node_incidence(incidences, node, key):
+    """The edge incident to node with key, or `None`."""
+    edges = incidences.get(("node", node, key))
+    if not edges:
+        return None
+    (edge, ) = edges
+    return edge
+
+def edge_incidence(incidences, edge, key):
+    """The node incident to edge with key, or `None`."""
+    nodes = incidences.get(("edge", edge, key))
+    if not nodes:
+        return None
+    (node, ) = nodes
+    return node
+
+def _incidences_to_diagram(node: HyperGraph, index, incidences):
     """
     Takes an nx_yaml rooted bipartite graph
-    and returns an equivalent string diagram
+    and returns an equivalent string diagram.
+    Nodes are loaded in post-order with an explicit stack
+    so that deep nesting doesn't reach the recursion limit.
     """
+    diagrams = []
+    stack = [(index, None)]
+    while stack:
+        index, n = stack.pop()
+        if n is None:
+            children = node_children(node, index, incidences)
+            stack.append((index, len(children)))
+            stack.extend((child, None) for child in reversed(children))
+            continue
+        args = diagrams[len(diagrams) - n:]
+        del diagrams[len(diagrams) - n:]
+        diagrams.append(load_node(node, index, args))
+    (ob, ) = diagrams
+    return ob
+
+def node_children(node: HyperGraph, index, incidences):
+    """The nodes a diagram is built from, keys and values alternate in mappings."""
+    kind = hif_node(node, index)["kind"]
+    children = []
+    nxt = node_incidence(incidences, index, "next")
+    while nxt is not None:
+        child = edge_incidence(incidences, nxt, "start")
+        if child is None:
+            break
+        children.append(child)
+        if kind == "mapping":
+            child = edge_incidence(incidences, node_incidence(incidences, child, "forward"), "start")
+            children.append(child)
+        if kind == "document":
+            break
+        nxt = node_incidence(incidences, child, "forward")
+    return children
+
+def load_node(node: HyperGraph, index, args):
+    """Builds the diagram of one node out of the diagrams of its children."""
     tag = (hif_node(node, index).get("tag") or "")[1:]
     kind = hif_node(node, index)["kind"]
+    if kind == "scalar":
+        return load_scalar(hif_node(node, index)["value"], tag)
+    return load_kind(kind, tag, args)
 
+def load_kind(kind, tag, args):
     match kind:
 
         case "stream":
-            ob = load_stream(node, index)
+            ob = load_stream(args)
         case "document":
-            ob = load_document(node, index)
-        case "scalar":
-            ob = load_scalar(node, index, tag)
+            ob = load_document(args)
         case "sequence":
-            ob = load_sequence(node, index, tag)
+            ob = load_sequence(args, tag)
         case "mapping":
-            ob = load_mapping(node, index, tag)
+            ob = load_mapping(tuple(batched(args, 2)), tag)
         case _:
             raise Exception(f"Kind \"{kind}\" doesn't match any.")
         
     return ob
 
 
-def load_scalar(node, index, tag):
+def _assert_composable(factory, diagram):
+    """The factory checks done by each `@` and `>>` that batching skips."""
+    assert_isinstance(diagram, factory)
+    if not issubclass(factory, diagram.factory):
+        raise TypeError(f"Expected {diagram.factory}, got {factory} instead.")
+
+def _whisker(diagram, left, right, dom=None):
+    """
+    The layers of `left @ diagram @ right`, each one's domain is the codomain before it.
+    Sharing it and `left` and `right` keeps one copy of each wide type.
+    """
+    layers = []
+    for layer in diagram.inside:
+        layers.append(_whisker_layer(layer, left, right, dom))
+        dom = layers[-1].cod
+    return layers
+
+def _whisker_layer(layer, left, right, dom=None):
+    """
+    `left @ layer @ right` built as one layer from its types, dom and cod.
+    `Layer.__init__` tensors and prints every object again, so whiskering wide types was quadratic.
+    """
+    head, *middle, tail = layer
+    items = (_tensor(left, head), *middle, _tensor(tail, right))
+    name = ""
+    for i, box_or_typ in enumerate(items):
+        if i % 2:
+            name += ("" if not name else " @ ") + str(box_or_typ)
+        elif box_or_typ:
+            name += ("" if not name else " @ ") + box_or_typ.name
+    factory = items[0].factory
+    if dom is None:
+        dom = _concat(factory, [x if i % 2 == 0 else x.dom for i, x in enumerate(items)])
+    cod = _concat(factory, [x if i % 2 == 0 else x.cod for i, x in enumerate(items)])
+    whiskered = _restore(layer, boxes_or_types=items, name=name, dom=dom, cod=cod)
+    # A box is the single arrow inside itself.
+    whiskered.inside = (whiskered,)
+    return whiskered
+
+def _tensor(left, right):
+    """`left @ right`, our `Ty` keeps the nonempty side as it is."""
+    if isinstance(left, Ty) and not (left and right):
+        return left.tensor(right)
+    # Either side as it is when the other is empty, one object for every layer it whiskers.
+    if not right and type(left) is left.factory:
+        return left
+    if not left and type(right) is left.factory:
+        return right
+    return _concat(left.factory, [left, right])
+
+def _concat(factory, types):
+    """
+    The tensor of types as a factory type, named by joining their names
+    as `Ty.__init__` would print it, without checking and printing each object again.
+    """
+    types = [t for t in types if t]
+    inside = tuple(chain.from_iterable(t.inside for t in types))
+    empty = factory()
+    return _restore(empty, inside=inside, name=" @ ".join(t.name for t in types) or empty.name)
+
+def _restore(template, **state):
+    """
+    A `template` with some attributes replaced, restored through the pickle protocol
+    like `copy.copy` does: discopy keeps `__getstate__` and `__setstate__` loading any pickle.
+    """
+    obj = type(template).__new__(type(template))
+    obj.__setstate__({**template.__getstate__(), **state})
+    return obj
+
+def _suffix_doms(diagrams):
+    """The tensor of the domains after each diagram, i.e. the wires on its right."""
+    rights, right = [], Ty()
+    for d in reversed(diagrams):
+        rights.append(right)
+        right = _tensor(d.dom, right)
+    return rights[::-1], right
+
+def tensor_all(diagrams):
+    """
+    `diagrams[0] @ ... @ diagrams[-1]` with the same layers,
+    whiskering each layer once instead of rebuilding the result at every `@`.
+    """
+    if isinstance(diagrams[0], ColumnarDiagram):
+        return ColumnarDiagram.tensor_all(diagrams)
+    factory = diagrams[0].factory
+    rights, dom = _suffix_doms(diagrams)
+    inside, cod = [], Ty()
+    for d, right in zip(diagrams, rights):
+        _assert_composable(factory, d)
+        inside += _whisker(d, cod, right, inside[-1].cod if inside else None)
+        cod = _tensor(cod, d.cod)
+    return factory(tuple(inside), dom, cod, _scan=False)
+
+def sequence_all(values):
+    """
+    The left fold `(ob @ value) >> (;)` over values assembled in one batch.
+    Each `(;)` box has the whole current codomain as its domain.
+    """
+    if isinstance(values[0], ColumnarDiagram):
+        return _sequence_columns(values)
+    factory = values[0].factory
+    rights, dom = _suffix_doms(values)
+    inside, cod = _whisker(values[0], Ty(), rights[0]), values[0].cod
+    for value, right in zip(values[1:], rights[1:]):
+        _assert_composable(factory, value)
+        inside += _whisker(value, cod, right, inside[-1].cod if inside else None)
+        cod = _tensor(cod, value.cod)
+        bases = cod[0].inside[0].exponent
+        exps = value.cod[0].inside[0].base
+        box = Box("(;)", cod, bases >> exps)
+        _assert_composable(factory, box)
+        inside += _whisker(box, Ty(), right, inside[-1].cod if inside else None)
+        cod = box.cod
+    return factory(tuple(inside), dom, cod, _scan=False)
+
+def _sequence_columns(values):
+    """`sequence_all` appending to columns, each value shifted right of the current codomain."""
+    # Only the whole domain, the wires right of each value are implicit in columns.
+    dom = values[0].dom.tensor(*(value.dom for value in values[1:]))
+    columns = ColumnarDiagram(values[0].factory, values[0].layer_factory, dom, None)
+    columns.extend(values[0], 0)
+    cod = values[0].cod
+    for value in values[1:]:
+        columns.extend(value, len(cod))
+        cod = _tensor(cod, value.cod)
+        bases = cod[0].inside[0].exponent
+        exps = value.cod[0].inside[0].base
+        box = Box("(;)", cod, bases >> exps)
+        columns.append(box, 0)
+        cod = box.cod
+    columns.cod = cod
+    return columns
+
+
+def load_scalar(v, tag):
     """
     2.3.1 (Sec:retracts): encode data as programs via retraction-style embedding.
     Fig. 2.3 (Sec:uev): reparametrization acts on program parameters, not raw inputs.
     """
-    v = hif_node(node, index)["value"]
     if not tag and not v:
         return Curry(Id(Ty() << Ty()), n=1)
     X = Ty(tag) if tag else Ty()
@@ -60,33 +316,15 @@ def load_scalar(node, index, tag):
         return Curry(Eval(A << Ty(), n=0))
     return Curry(Eval(Ty() << X @ A), n=2)
 
-def load_mapping(node, index, tag):
+def load_mapping(kvs, tag):
     """2.2.3 (Sec:compos-prog) Build keyed computations using composed programs."""
-    ob = Id()
-    i = 0
-    nxt = tuple(hif_node_incidences(node, index, key="next"))
-    while True:
-        if not nxt:
-            break
-        ((k_edge, _, _, _), ) = nxt
-        ((_, k, _, _), ) = hif_edge_incidences(node, k_edge, key="start")
-        ((v_edge, _, _, _), ) = hif_node_incidences(node, k, key="forward")
-        ((_, v, _, _), ) = hif_edge_incidences(node, v_edge, key="start")
-        key = _incidences_to_diagram(node, k)
-        value = _incidences_to_diagram(node, v)
-
+    kv_obs = []
+    for key, value in kvs:
         exps = Ty().tensor(*map(lambda x: x.inside[0].exponent, key.cod))
         bases = Ty().tensor(*map(lambda x: x.inside[0].base, value.cod))
         kv_box = Box("(;)", key.cod @ value.cod, exps >> bases)
-        kv = key @ value >> kv_box
-
-        if i==0:
-            ob = kv
-        else:
-            ob = ob @ kv
-
-        i += 1
-        nxt = tuple(hif_node_incidences(node, v, key="forward"))
+        kv_obs.append(key @ value >> kv_box)
+    ob = tensor_all(kv_obs) if kv_obs else Id()
     exps = Ty().tensor(*map(lambda x: x.inside[0].exponent, ob.cod))
     bases = Ty().tensor(*map(lambda x: x.inside[0].base, ob.cod))
     par_box = Box("(||)", ob.cod, bases << exps)
@@ -97,27 +335,14 @@ def load_mapping(node, index, tag):
         ob = ob >> box
     return ob
 
-def load_sequence(node, index, tag):
+def load_sequence(values, tag):
     """2.2.3 (Sec:compos-prog) Fold a YAML sequence into repeated (;) composition."""
-    ob = Id()
-    i = 0
-    nxt = tuple(hif_node_incidences(node, index, key="next"))
-    while True:
-        if not nxt:
-            break
-        ((v_edge, _, _, _), ) = nxt
-        ((_, v, _, _), ) = hif_edge_incidences(node, v_edge, key="start")
-        value = _incidences_to_diagram(node, v)
-        if i==0:
-            ob = value
-        else:
-            ob = ob @ value
-            bases = ob.cod[0].inside[0].exponent
-            exps = value.cod[0].inside[0].base
-            ob = ob >> Box("(;)", ob.cod, bases >> exps)
-
-        i += 1
-        nxt = tuple(hif_node_incidences(node, v, key="forward"))
+    if not values:
+        ob = Id()
+    elif len(values) == 1:
+        ob, = values
+    else:
+        ob = sequence_all(values)
     if tag:
         bases = Ty().tensor(*map(lambda x: x.inside[0].exponent, ob.cod))
         exps = Ty().tensor(*map(lambda x: x.inside[0].base, ob.cod))
@@ -125,31 +350,17 @@ def load_sequence(node, index, tag):
         ob = ob >> Box(tag, ob.cod, Ty() >> Ty(tag))
     return ob
 
-def load_document(node, index):
-    nxt = tuple(hif_node_incidences(node, index, key="next"))
-    ob = Id()
-    if nxt:
-        ((root_e, _, _, _), ) = nxt
-        ((_, root, _, _), ) = hif_edge_incidences(node, root_e, key="start")
-        ob = _incidences_to_diagram(node, root)
-    return ob
+def load_document(roots):
+    return roots[0] if roots else Id()
 
-def load_stream(node, index):
-    ob = Id()
-    nxt = tuple(hif_node_incidences(node, index, key="next"))
-    while True:
-        if not nxt:
-            break
-        ((nxt_edge, _, _, _), ) = nxt
-        starts = tuple(hif_edge_incidences(node, nxt_edge, key="start"))
-        if not starts:
-            break
-        ((_, nxt_node, _, _), ) = starts
-        doc = _incidences_to_diagram(node, nxt_node)
-        if ob == Id():
-            ob = doc
+def load_stream(docs):
+    obs = []
+    for doc in docs:
+        # Leading empty documents are replaced by the next one.
+        if len(obs) == 1 and not len(obs[0]) and obs[0].dom == Ty():
+            obs[-1] = doc
         else:
-            ob = ob @ doc
-
-        nxt = tuple(hif_node_incidences(node, nxt_node, key="forward"))
-    return ob
+            obs.append(doc)
+    if len(obs) < 2:
+        return obs[0] if obs else Id()
+    return tensor_all(obs)
@@ -0,0 +1,105 @@
+"""
+Background drawing: programs run while worker processes draw their diagrams.
+Requests for the same output path coalesce, only the newest diagram is drawn.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import logging
+from multiprocessing import get_all_start_methods, get_context
+from threading import Condition, Thread
+
+from .files import diagram_draw, is_drawn
+
+
+class RenderPool:
+    """
+    Draws with `draw(path, diagram)` in worker processes, at most one drawing per path at a time.
+    A request for a path that is being drawn waits and replaces any older waiting request.
+    """
+    def __init__(self, workers=1, draw=diagram_draw):
+        self.draw = draw
+        self.executor, self.started = None, False
+        # Reentrant: a callback added to a future that is already done runs right away.
+        self.condition = Condition()
+        # Paths being drawn, with no future yet while the workers start.
+        self.running, self.waiting, self.starting = {}, {}, {}
+        # Starting workers takes seconds, the caller never waits for it.
+        self.starter = Thread(target=self.start_executor, args=(workers,), daemon=True)
+        self.starter.start()
+
+    def start_executor(self, workers):
+        # Workers start from a clean interpreter, forking a threaded process is unsafe.
+        method = "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+        try:
+            executor = ProcessPoolExecutor(workers, mp_context=get_context(method))
+            # The worker processes start on the first submit, outside the lock.
+            executor.submit(int).result()
+        except Exception as e:
+            logging.error(f"drawing workers failed to start: {e}")
+            executor = None
+        with self.condition:
+            self.executor, self.started = executor, True
+            starting, self.starting = self.starting, {}
+            if executor is None:
+                self.waiting.clear()
+            for path, diagram in starting.items():
+                del self.running[path]
+                if executor is not None:
+                    self.start(path, diagram)
+            self.condition.notify_all()
+
+    def submit(self, path, diagram):
+        with self.condition:
+            if path in self.running:
+                self.waiting[path] = diagram
+                return
+            self.start(path, diagram)
+
+    def start(self, path, diagram):
+        # Called with the lock held, `wait` never sees a path between two drawings.
+        if not self.started:
+            self.running[path] = None
+            self.starting[path] = diagram
+            return
+        if self.executor is None:
+            return
+        future = self.executor.submit(self.draw, path, diagram)
+        self.running[path] = future
+        future.add_done_callback(partial(self.done, path))
+
+    def done(self, path, future):
+        if future.exception() is not None:
+            logging.error(f"drawing {path} failed: {future.exception()}")
+        with self.condition:
+            del self.running[path]
+            diagram = self.waiting.pop(path, None)
+            if diagram is not None:
+                self.start(path, diagram)
+            self.condition.notify_all()
+
+    def wait(self):
+        """Blocks until every requested drawing is done."""
+        with self.condition:
+            self.condition.wait_for(lambda: not self.running)
+
+    def shutdown(self):
+        self.wait()
+        self.starter.join()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+render_pool = None
+
+def draw_async(path, diagram):
+    """`diagram_draw` in the shared `RenderPool`, returning immediately, nothing to do when up to date."""
+    global render_pool
+    if is_drawn(path, diagram):
+        return
+    if render_pool is None:
+        render_pool = RenderPool()
+    render_pool.submit(path, diagram)
+
+def wait_drawings():
+    if render_pool is not None:
+        render_pool.wait()
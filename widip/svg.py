@@ -0,0 +1,117 @@
+"""
+SVG drawing backend: writes the `to_drawing` layout of a diagram straight as SVG text,
+without building a Matplotlib figure.
+"""
+from math import pi, sqrt
+from xml.sax.saxutils import escape, quoteattr
+
+from discopy.drawing.backend import COLORS, DEFAULT, Backend
+
+
+# Pixels per diagram unit, Matplotlib draws a unit as one inch at 100 dpi.
+SCALE = 100
+# Font sizes and node areas are in points.
+POINT = SCALE / 72
+
+
+class SVG(Backend):
+    """Collects SVG elements from diagram coordinates, y pointing up as in discopy."""
+    def __init__(self, width, height, linewidth=1):
+        self.width, self.height, self.linewidth = width, height, linewidth
+        self.elements = []
+        super().__init__()
+
+    def xy(self, i, j):
+        """SVG coordinates, y pointing down."""
+        return i * SCALE, (self.height - j) * SCALE
+
+    def point(self, i, j):
+        x, y = self.xy(i, j)
+        return f"{x:.2f},{y:.2f}"
+
+    def draw_text(self, text, i, j, **params):
+        x, y = self.xy(i, j)
+        fontsize = params.get("fontsize") or DEFAULT["fontsize"]
+        anchor = {"center": "middle", "right": "end"}.get(
+            params.get("ha", params.get("horizontalalignment")), "start")
+        baseline = {"center": "central", "top": "hanging"}.get(
+            params.get("va", params.get("verticalalignment")), "auto")
+        self.elements.append(
+            f'<text x="{x:.2f}" y="{y:.2f}" font-size="{fontsize * POINT:.1f}" '
+            f'text-anchor="{anchor}" dominant-baseline="{baseline}">{escape(str(text))}</text>')
+        super().draw_text(text, i, j, **params)
+
+    def draw_node(self, i, j, **params):
+        x, y = self.xy(i, j)
+        radius = sqrt(300 * params.get("nodesize", 1) / pi) * POINT
+        fill = COLORS[params.get("color", "black")]
+        stroke = COLORS.get(params.get("edgecolor"), "none")
+        if params.get("shape", "circle") == "circle":
+            self.elements.append(
+                f'<circle cx="{x:.2f}" cy="{y:.2f}" r="{radius:.2f}" fill="{fill}" stroke="{stroke}"/>')
+        else:
+            self.elements.append(
+                f'<rect x="{x - radius:.2f}" y="{y - radius:.2f}" '
+                f'width="{2 * radius:.2f}" height="{2 * radius:.2f}" fill="{fill}" stroke="{stroke}"/>')
+        super().draw_node(i, j, **params)
+
+    def draw_polygon(self, *points, facecolor=DEFAULT["facecolor"], edgecolor=DEFAULT["edgecolor"]):
+        self.elements.append(
+            f'<polygon points="{" ".join(self.point(*p) for p in points)}" '
+            f'fill="{COLORS[facecolor]}" stroke="{COLORS[edgecolor]}" stroke-width="{self.linewidth}"/>')
+        super().draw_polygon(*points)
+
+    def draw_wire(self, source, target, bend_out=False, bend_in=False, style=None):
+        # The same quadratic Bezier as the Matplotlib backend.
+        mid = (target[0], source[1]) if bend_out else (source[0], target[1])
+        self.elements.append(
+            f'<path d="M{self.point(*source)} Q{self.point(*mid)} {self.point(*target)}" '
+            f'fill="none" stroke="black" stroke-width="{self.linewidth}"/>')
+        super().draw_wire(source, target, bend_out=bend_out, bend_in=bend_in)
+
+    def draw_spiders(self, graph, draw_box_labels=True, **params):
+        for node in graph.nodes:
+            if node.kind == "box" and node.box.draw_as_spider:
+                i, j = graph.positions[node]
+                self.draw_node(i, j, color=node.box.color, shape=node.box.shape,
+                               nodesize=params.get("nodesize", 1))
+                if draw_box_labels:
+                    self.draw_text(node.box.drawing_name, i, j, ha="center", va="center",
+                                   fontsize=params.get("fontsize"))
+        super().draw_spiders(graph, draw_box_labels)
+
+    def output(self, path=None, show=False, **params):
+        """Writes the SVG document to path, returning it when path is `None`."""
+        mx, my = params.get("margins", DEFAULT["margins"])
+        width, height = self.width * SCALE, self.height * SCALE
+        x, y = -mx * width, -my * height
+        width, height = max(width * (1 + 2 * mx), 1), max(height * (1 + 2 * my), 1)
+        head = (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+            f'viewBox="{x:.2f} {y:.2f} {width:.2f} {height:.2f}" font-family={quoteattr("DejaVu Sans, sans-serif")}>\n'
+            f'<rect x="{x:.2f}" y="{y:.2f}" width="{width:.2f}" height="{height:.2f}" fill="white"/>\n')
+        lines = [head, *(f"{element}\n" for element in self.elements), "</svg>\n"]
+        if path is None:
+            return "".join(lines)
+        with open(path, "w") as file:
+            file.writelines(lines)
+
+
+def draw_svg(diagram, path=None, **params):
+    """
+    Draws diagram as SVG with the layout and parameters of `Diagram.draw`,
+    writing it to path or returning the SVG text.
+    """
+    drawing = diagram.to_drawing()
+    params.setdefault("asymmetry", 0.125 * any(
+        box.is_conjugate or box.is_transpose or box.is_dagger and not box.draw_as_braid
+        for box in drawing.boxes))
+    params["nodesize"] = round(
+        params.get("nodesize", 1.) / sqrt(max(drawing.height, drawing.width, 0.01)), 3)
+    drawing.add_box_corners()
+    backend = SVG(drawing.width, drawing.height, linewidth=params.get("linewidth", 1))
+    backend.draw_boundary(drawing, **params)
+    backend.draw_wires(drawing, **params)
+    backend.draw_boxes(drawing, **params)
+    backend.draw_spiders(drawing, **params)
+    return backend.output(path, margins=params.get("margins", DEFAULT["margins"]))
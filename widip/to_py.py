@@ -1,32 +1,102 @@
+"""
+Python backend: each widip diagram becomes one generated Python function
+with a local per wire and a straight-line call per box.
+"""
 from functools import partial
-from itertools import repeat
-import operator
+from itertools import count
+
+from discopy import closed, markov, python, symmetric
 
-from discopy import python, symmetric
-from discopy.utils import tuplify as discopy_tuplify
 from .lang import *
 from .computer import *
 
 
-tuplify = partial(operator.call, discopy_tuplify)
-partial_const = partial(next, repeat(partial))
-empty_tuple = partial(next, repeat(()))
-tuple_type = partial(operator.mul, (partial, ))
-copy_builder = partial(operator.call, python.Function.copy)
-delete_builder = partial(operator.call, python.Function.discard)
-
-def to_py_ar(ar):
-    if not ar.dom:
-        return empty_tuple
-    dom = tuple_type(len(ar.dom))
-    if isinstance(ar, Copy):
-        return copy_builder(dom)
-    if isinstance(ar, Delete):
-        return delete_builder(dom)
-    assert not ar
-
-to_py = symmetric.Functor(
-    partial_const,
-    to_py_ar,
-    dom=computer.Category(),
-    cod=python.Category())
+def suffixed(f, suffix, *xs):
+    """The program of `Curry(f, left=False)`, curried wires come first."""
+    return f(*xs, *suffix)
+
+
+class PyBackend(Memoized):
+    """
+    Compiles diagrams into `python.Function`, remembering the function of each diagram.
+
+    `Copy`, `Delete` and `Swap` only move wires, the lang bubbles are inlined
+    with `specialize`, `Eval` calls its program and `Curry` makes one from a compiled diagram.
+    Any other box is called through `ar(box)`, a Python callable returning its outputs.
+    """
+    def __init__(self, ar=None):
+        self.ar = ar
+
+    def __call__(self, diagram):
+        env, lines = {"partial": partial, "suffixed": suffixed}, []
+        names = map("x{}".format, count())
+        dom = [next(names) for _ in diagram.dom]
+        cod = self.emit_diagram(diagram, dom, env, lines, names)
+        lines.append(f"return {tuple_source(cod)}")
+        source = f"def diagram({', '.join(dom)}):\n" + "".join(f"    {line}\n" for line in lines)
+        exec(compile(source, "<widip diagram>", "exec"), env)
+        inside = env["diagram"]
+        inside.source = source
+        return python.Function(inside, (object, ) * len(diagram.dom), (object, ) * len(diagram.cod))
+
+    def emit_diagram(self, diagram, wires, env, lines, names):
+        """Appends the lines of diagram applied to wires, returning its output wires."""
+        for layer in diagram.inside:
+            offset, outputs = 0, []
+            for i, box_or_typ in enumerate(layer.boxes_or_types):
+                if i % 2 == 0:
+                    outputs += wires[offset:offset + len(box_or_typ)]
+                    offset += len(box_or_typ)
+                else:
+                    inputs = wires[offset:offset + len(box_or_typ.dom)]
+                    outputs += self.emit_box(box_or_typ, inputs, env, lines, names)
+                    offset += len(box_or_typ.dom)
+            wires = outputs
+        return wires
+
+    def emit_box(self, box, inputs, env, lines, names):
+        if isinstance(box, (Sequential, Parallel, Partial, Data)):
+            return self.emit_diagram(box.specialize(), inputs, env, lines, names)
+        if isinstance(box, (Copy, Delete)) and not box.dom and not box.cod:
+            return []
+        if isinstance(box, markov.Copy):
+            return inputs * (len(box.cod) // max(len(box.dom), 1))
+        if isinstance(box, markov.Discard):
+            return []
+        if isinstance(box, symmetric.Swap):
+            return inputs[len(box.left):] + inputs[:len(box.left)]
+        outputs = [next(names) for _ in box.cod]
+        if isinstance(box, closed.Eval):
+            program, args = (inputs[0], inputs[1:]) if box.left else (inputs[-1], inputs[:-1])
+            call = f"{program}({', '.join(args)})"
+        elif isinstance(box, closed.Curry):
+            f = env_name(env, self(box.arg).inside)
+            call = f"partial({f}, {', '.join(inputs)})" if box.left \
+                else f"partial(suffixed, {f}, {tuple_source(inputs)})"
+        else:
+            f = self.ar(box) if self.ar is not None else None
+            if f is None:
+                raise TypeError(f"No Python implementation for box {box}")
+            call = f"{env_name(env, f)}({', '.join(inputs)})"
+        if len(outputs) == 1:
+            lines.append(f"{outputs[0]} = {call}")
+        elif outputs:
+            lines.append(f"{', '.join(outputs)} = {call}")
+        else:
+            lines.append(call)
+        return outputs
+
+
+def env_name(env, value):
+    name = f"f{len(env)}"
+    env[name] = value
+    return name
+
+def tuple_source(wires):
+    """A single wire is returned as is, like `python.Function`."""
+    if len(wires) == 1:
+        return wires[0]
+    return f"({''.join(f'{x}, ' for x in wires)})"
+
+
+to_py = PyBackend()
@@ -0,0 +1,95 @@
+"""
+Per-box execution traces in the Chrome trace event format,
+to open in Perfetto or chrome://tracing.
+
+    python -m widip --trace out.json file.yaml
+
+Boxes are complete ("X") events on the thread that ran them,
+child processes get their own track with their exit status and CPU time.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import threading
+import time
+
+
+# Events of the current trace, `None` when not tracing.
+trace_events = None
+trace_start = 0
+
+
+def start_tracing():
+    global trace_events, trace_start
+    trace_events, trace_start = [], time.perf_counter_ns()
+
+def write_trace(path):
+    """Writes the events recorded so far to path and stops tracing."""
+    global trace_events
+    events, trace_events = trace_events, None
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events or [], "displayTimeUnit": "ms"}, f)
+
+@contextmanager
+def traced_to(path):
+    start_tracing()
+    try:
+        yield
+    finally:
+        write_trace(path)
+
+def timestamp():
+    """Microseconds since the trace started, the unit of the trace format."""
+    return (time.perf_counter_ns() - trace_start) / 1000
+
+def text_size(value):
+    """Bytes of the text values going through a box, `None` for anything else."""
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, tuple):
+        sizes = tuple(map(text_size, value))
+        return None if None in sizes else sum(sizes)
+    return None
+
+def traced_box(runner):
+    """Records a span around each call of a runner taking the box and then its arguments."""
+    @wraps(runner)
+    def traced_runner(ar, *args):
+        if trace_events is None:
+            return runner(ar, *args)
+        start = timestamp()
+        result = runner(ar, *args)
+        trace_events.append({
+            "name": ar.name, "cat": "box", "ph": "X",
+            "ts": start, "dur": timestamp() - start,
+            "pid": os.getpid(), "tid": threading.get_ident(),
+            "args": {
+                "dom": str(ar.dom), "cod": str(ar.cod),
+                "bytes_in": text_size(args[len(ar.dom):]),
+                "bytes_out": text_size(result)}})
+        return result
+    return traced_runner
+
+def wait_traced(process, argv, start, **texts):
+    """
+    `process.wait()` recording the process as an event when tracing,
+    with the size of the texts it read and wrote.
+    Reaps the child with `os.wait4` to read its CPU time.
+    """
+    if trace_events is None or not hasattr(os, "wait4"):
+        return process.wait()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    trace_events.append({
+        "name": "process_name", "ph": "M", "pid": process.pid,
+        "args": {"name": " ".join(argv)}})
+    trace_events.append({
+        "name": argv[0], "cat": "process", "ph": "X",
+        "ts": start, "dur": timestamp() - start,
+        "pid": process.pid, "tid": process.pid,
+        "args": {
+            "argv": list(argv), "exit_status": process.returncode,
+            "cpu_user_s": usage.ru_utime, "cpu_system_s": usage.ru_stime,
+            **{k: text_size(v) for k, v in texts.items()}}})
+    return process.returncode
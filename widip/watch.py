@@ -1,46 +1,105 @@
+import logging
 from pathlib import Path
-import sys
+from threading import Condition, Thread
+import time
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 from yaml import YAMLError
 
 from discopy.closed import Id, Ty, Box
-from discopy.utils import tuplify, untuplify
 
 from .loader import repl_read
-from .files import diagram_draw, file_diagram
+from .files import file_diagram
+from .render import draw_async, wait_drawings
 from .widish import SHELL_RUNNER, compile_shell_program
 
 
 # TODO watch functor ??
 
+# Events for a file within this many seconds of each other make one reload.
+DEBOUNCE_SECONDS = 0.2
+IGNORED_DIRS = ("__pycache__", "node_modules", "svg")
+
+
 class ShellHandler(FileSystemEventHandler):
-    """Reload the shell on change."""
-    def on_modified(self, event):
-        if event.src_path.endswith(".yaml"):
-            print(f"reloading {event.src_path}")
-            try:
-                fd = file_diagram(str(event.src_path))
-                diagram_draw(Path(event.src_path), fd)
-                diagram_draw(Path(event.src_path+".2"), fd)
-            except YAMLError as e:
-                print(e)
+    """
+    Reload the shell on change.
+    Events are coalesced per file and reloaded one at a time once they settle.
+    """
+    def __init__(self, debounce=DEBOUNCE_SECONDS):
+        super().__init__()
+        self.debounce = debounce
+        self.pending = {}
+        self.stopped = False
+        self.changed = Condition()
+        self.reloader = Thread(target=self.reload_settled, daemon=True)
+        self.reloader.start()
+
+    def stop(self):
+        """Ends the reloading thread, dropping changes that have not settled yet."""
+        with self.changed:
+            self.stopped = True
+            self.changed.notify()
+        self.reloader.join()
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in ("created", "modified", "moved"):
+            return
+        path = event.dest_path if event.event_type == "moved" else event.src_path
+        if not is_source(path):
+            return
+        with self.changed:
+            self.pending[path] = time.monotonic() + self.debounce
+            self.changed.notify()
+
+    def reload_settled(self):
+        while True:
+            with self.changed:
+                while not self.pending and not self.stopped:
+                    self.changed.wait()
+                if self.stopped:
+                    return
+                path = min(self.pending, key=self.pending.get)
+                delay = self.pending[path] - time.monotonic()
+                if delay > 0:
+                    self.changed.wait(delay)
+                    continue
+                del self.pending[path]
+            self.reload(path)
+
+    def reload(self, path):
+        print(f"reloading {path}")
+        try:
+            fd = file_diagram(path)
+            draw_async(Path(path), fd)
+        except Exception as e:
+            # One bad file must not stop reloading the others.
+            logging.error(f"{path}: {e}")
 
-def watch_main():
+def is_source(path):
+    """YAML files outside hidden and ignored directories, drawings and other outputs are not."""
+    path = Path(path)
+    return path.suffix == ".yaml" and not any(
+        part in IGNORED_DIRS or part.startswith(".") and part not in (".", "..")
+        for part in path.parts[:-1])
+
+def watch_main(shell_handler):
     """the process manager for the reader and """
     #  TODO watch this path to reload changed files,
     # returning an IO as always and maintaining the contract.
     print(f"watching for changes in current path")
     observer = Observer()
-    shell_handler = ShellHandler()
+    # `is_source` leaves out outputs and hidden and ignored directories.
     observer.schedule(shell_handler, ".", recursive=True)
     observer.start()
     return observer
 
 def shell_main(file_name, draw=True):
+    # One observer for the whole session.
+    shell_handler = ShellHandler()
+    observer = watch_main(shell_handler)
     try:
         while True:
-            observer = watch_main()
             try:
                 prompt = f"--- !{file_name}\n"
                 source = input(prompt)
@@ -52,8 +111,9 @@ def shell_main(file_name, draw=True):
                 path = Path(file_name)
 
                 if draw:
-                    diagram_draw(path, source_d)
-                # source_d = compile_shell_program(source_d)
+                    # Drawing never delays the result, a newer prompt replaces a pending drawing.
+                    draw_async(path, source_d)
+                source_d = compile_shell_program(source_d)
                 # diagram_draw(Path(file_name+".2"), source_d)
                 # source_d = Spider(0, len(source_d.dom), Ty("io")) \
                 #     >> source_d \
@@ -65,20 +125,11 @@ def shell_main(file_name, draw=True):
                 print()
             except YAMLError as e:
                 print(e)
-            finally:
-                observer.stop()
     except EOFError:
         print("⌁")
         exit(0)
-
-def widish_main(file_name, draw):
-    fd = file_diagram(file_name)
-    path = Path(file_name)
-    if draw:
-        diagram_draw(path, fd)
-    constants = tuple(x.name for x in fd.dom)
-    runner = SHELL_RUNNER(fd)(*constants)
-
-    run_res = runner("") if sys.stdin.isatty() else runner(sys.stdin.read())
-
-    print(*(tuple(x.rstrip() for x in tuplify(untuplify(run_res)) if x)), sep="\n")
+    finally:
+        observer.stop()
+        observer.join()
+        shell_handler.stop()
+        wait_drawings()
@@ -1,8 +1,30 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
-from subprocess import CalledProcessError, run
+from glob import glob
+import hashlib
+from inspect import isawaitable
+from io import UnsupportedOperation
+import logging
+from multiprocessing import get_all_start_methods, get_context
+import os
+from pathlib import Path
+import signal
+from shutil import copyfileobj, which
+from subprocess import CalledProcessError, PIPE, Popen, run
+import sys
+from threading import Thread
 
 from discopy.utils import tuplify, untuplify
-from discopy import closed, python
+from discopy import closed, markov, python
+
+from .cache import RESULT_CACHE_BYTES, cache_load, cache_store, content_key
+from .computer import Copy, Delete, Memoized
+from .lang import Data
+from .files import file_diagram
+from .loader import event_read
+from .render import draw_async, wait_drawings
+from .trace import timestamp, traced_box, wait_traced
 
 
 io_ty = closed.Ty("io")
@@ -11,32 +33,350 @@ def split_args(ar, args):
     n = len(ar.dom)
     return args[:n], args[n:]
 
+@traced_box
 def run_native_subprocess_constant(ar, *args):
     b, params = split_args(ar, args)
     if not params:
         return "" if ar.dom == closed.Ty() else ar.dom.name
     return untuplify(params)
 
+# `ThreadPoolExecutor`'s default, branch threads mostly wait on their processes.
+MAP_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+@traced_box
 def run_native_subprocess_map(ar, *args):
+    """
+    2.2.3 (||) runs every branch on the same input.
+    Branches are independent so up to `MAP_WORKERS` run at once, results keep the branch order.
+    """
     b, params = split_args(ar, args)
-    mapped = []
-    for kv in b:
-        res = kv(*tuplify(params))
-        mapped.append(untuplify(res))
-    return untuplify(tuple(mapped))
+    run_branch = lambda kv: untuplify(kv(*tuplify(params)))
+    if len(b) < 2:
+        return untuplify(tuple(map(run_branch, b)))
+    with ThreadPoolExecutor(max_workers=min(len(b), MAP_WORKERS)) as executor:
+        mapped = tuple(executor.map(run_branch, b))
+    return untuplify(mapped)
 
+@traced_box
 def run_native_subprocess_seq(ar, *args):
+    """
+    2.2.3 (;) runs F then G on the output of F.
+    When both sides are native commands they stream through OS pipes instead.
+    """
     b, params = split_args(ar, args)
+    stages = native_stages(partial(run_native_subprocess_seq, ar, *b))
+    if stages is not None:
+        return run_native_pipeline(stages, *params)
     b0 = b[0](*tuplify(params))
     b1 = b[1](*tuplify(b0))
     return untuplify(b1)
 
+@traced_box
 def run_native_subprocess_default(ar, *args):
     """
     7.4 Universality of program execution: A function {}:P×A→B is universal when any function g:X×A→B has an implementation G:X⊸P evaluated by {}.
     We choose `subprocess.run` where X is the command name.
     """
     b, params = split_args(ar, args)
+    return run_native_pipeline(((ar.name, *b), ), *params)
+
+@traced_box
+def run_native_subprocess_pipeline(ar, *params):
+    """A native `(;)` chain fused into one job when its program was built, see `seq_program`."""
+    return run_native_pipeline(ar.data, *params)
+
+def seq_program(ar, *b):
+    """
+    The (;) program of F and G, simplified before it runs:
+    a chain of native commands becomes one pipeline job and a `Curry(Id)` G is dropped.
+    """
+    if len(b) == 2 and is_identity_program(b[1]):
+        return b[0]
+    stages = native_stages(partial(run_native_subprocess_seq, ar, *b))
+    if stages is not None:
+        job = closed.Box(ar.name, closed.Ty(), ar.cod, data=stages)
+        return partial(run_native_subprocess_pipeline, job)
+    return partial(run_native_subprocess_seq, ar, *b)
+
+def is_identity_program(program):
+    """Whether program is a `Curry(Id)` constant, which passes its input through."""
+    if not isinstance(program, partial) or program.func is not run_native_subprocess_constant:
+        return False
+    ar, *b = program.args
+    return not b and isinstance(ar, closed.Curry) and not ar.dom and not ar.arg.inside
+
+def native_stages(program):
+    """
+    The argv of each command in a program made only of native commands and `(;)`,
+    or `None` when some stage has to run in Python.
+    """
+    if not isinstance(program, partial) or program.func not in NATIVE_PROGRAMS:
+        return None
+    ar, *args = program.args
+    if program.func is run_native_subprocess_pipeline:
+        return None if args else ar.data
+    b, params = split_args(ar, args)
+    if params:
+        return None
+    if program.func in (run_native_subprocess_default, async_run_native_subprocess_default):
+        if not all(isinstance(x, str) for x in b):
+            return None
+        return ((ar.name, *b), )
+    first, second = map(native_stages, b)
+    if first is None or second is None:
+        return None
+    return first + second
+
+def run_native_pipeline(stages, stdin=None, stdout=None):
+    """
+    Starts every stage at once with each stdout wired to the next stdin by an OS pipe.
+    Only the input of the first process and the output of the last one go through Python.
+
+    stdin is a string, a file or `None` to inherit ours.
+    Files with a descriptor are handed to the first process as they are,
+    other files are copied in `CHUNK_SIZE` pieces.
+    With a stdout file the output goes to it the same way and nothing is returned.
+    Raises `CalledProcessError` for the first stage that failed, like `run(..., check=True)`.
+    """
+    if CACHED_COMMANDS and stdin is not None and any(argv[0] in CACHED_COMMANDS for argv in stages):
+        output = run_cached_pipeline(stages, stdin)
+        if stdout is None:
+            return output
+        stdout.write(output)
+        return None
+    source, feed = stdin_source(stdin)
+    opened = None
+    if len(stages) > 1 and is_cat_file(stages[0]):
+        # `cat file | ...` reads the file itself, the next process can do that.
+        try:
+            opened = open(stages[0][1], "rb")
+        except OSError:
+            pass
+        else:
+            stages, source, feed = stages[1:], opened, None
+
+    processes, starts = [], []
+    try:
+        for i, argv in enumerate(stages):
+            sink = stdout if has_fileno(stdout) and i == len(stages) - 1 else PIPE
+            starts.append(timestamp())
+            process = Popen(argv, stdin=source, stdout=sink, text=True)
+            if processes:
+                # Only the child holds the read end so that SIGPIPE reaches the writer.
+                processes[-1].stdout.close()
+            processes.append(process)
+            source = process.stdout
+    except BaseException:
+        # E.g. a missing command, the stages already started would wait for input forever.
+        for process in processes:
+            process.kill()
+            if process.stdout is not None:
+                process.stdout.close()
+            process.wait()
+        raise
+    finally:
+        if opened is not None:
+            opened.close()
+
+    feeder = None
+    if feed is not None:
+        feeder = Thread(target=feed_stdin, args=(processes[0].stdin, feed))
+        feeder.start()
+    output = None
+    if stdout is None:
+        output = processes[-1].stdout.read()
+        processes[-1].stdout.close()
+    elif not has_fileno(stdout):
+        copyfileobj(processes[-1].stdout, stdout, CHUNK_SIZE)
+        processes[-1].stdout.close()
+    if feeder is not None:
+        feeder.join()
+    for i, (argv, process, start) in enumerate(zip(stages, processes, starts)):
+        texts = {}
+        if i == 0:
+            texts["bytes_in"] = feed
+        if i == len(stages) - 1:
+            texts["bytes_out"] = output
+        wait_traced(process, argv, start, **texts)
+    check_statuses(stages, [process.returncode for process in processes], output)
+    return output
+
+def check_statuses(stages, statuses, output):
+    """
+    Raises `CalledProcessError` for the first stage that exited with an error.
+    A stage killed by SIGPIPE only stopped writing to a later one that had finished reading.
+    """
+    for i, (argv, status) in enumerate(zip(stages, statuses)):
+        if status == 0 or i < len(stages) - 1 and status == -signal.SIGPIPE:
+            continue
+        raise CalledProcessError(status, argv, output)
+
+CHUNK_SIZE = 2**16
+
+# Commands whose output only depends on their argv and stdin,
+# e.g. `WIDIP_CACHE_COMMANDS=awk,sort,grep` or `--cache-commands`.
+CACHED_COMMANDS = set(filter(None, os.environ.get("WIDIP_CACHE_COMMANDS", "").split(",")))
+# Environment variables that change what a command outputs.
+FINGERPRINT_ENV = ("LANG", "LC_ALL", "LC_COLLATE", "LC_CTYPE", "LC_NUMERIC", "TZ")
+
+def run_cached_pipeline(stages, stdin):
+    """
+    `run_native_pipeline` taking each output of a `CACHED_COMMANDS` stage from the result cache,
+    so that only the stages after a changed input run again.
+    Stages in between still stream through OS pipes.
+    """
+    text = stdin if isinstance(stdin, str) else stdin.read()
+    if isinstance(text, bytes):
+        text = text.decode()
+    i = 0
+    while i < len(stages):
+        if stages[i][0] in CACHED_COMMANDS:
+            text = run_cached_stage(stages[i], text)
+            i += 1
+            continue
+        j = next((k for k in range(i, len(stages)) if stages[k][0] in CACHED_COMMANDS), len(stages))
+        text = run_native_pipeline(stages[i:j], text)
+        i = j
+    return text
+
+def run_cached_stage(argv, text):
+    """
+    A failing run raises like `run_native_pipeline` and its output is not stored.
+    Stages naming a directory run every time, its contents are not part of the key.
+    """
+    digests = file_digests(argv[1:])
+    key = output = None
+    if digests is not None:
+        key = content_key(
+            *(x.encode() for x in argv), text.encode(), command_fingerprint(argv[0]).encode(),
+            *digests)
+        output = cache_load("results", key)
+    if output is None:
+        process = run(argv, input=text, stdout=PIPE, text=True)
+        output = process.stdout
+        check_statuses((argv, ), (process.returncode, ), output)
+        if key is not None:
+            cache_store("results", key, output, RESULT_CACHE_BYTES)
+    return output
+
+def file_digests(args):
+    """
+    The contents hash of each argument naming a file, e.g. an `awk -f` script,
+    or `None` when an argument names a directory.
+    """
+    digests = []
+    for arg in args:
+        if os.path.isdir(arg):
+            return None
+        if os.path.isfile(arg):
+            with open(arg, "rb") as file:
+                digests.append(hashlib.file_digest(file, "sha256").digest())
+    return digests
+
+def command_fingerprint(name):
+    """The executable, its version as size and mtime, the directory and the locale it runs in."""
+    path = which(name)
+    try:
+        stat = os.stat(path)
+        version = f"{stat.st_size}:{stat.st_mtime_ns}"
+    except (TypeError, OSError):
+        version = ""
+    env = ",".join(f"{k}={os.environ.get(k, '')}" for k in FINGERPRINT_ENV)
+    return f"{path}:{version}:{os.getcwd()}:{env}"
+
+def stdin_source(stdin):
+    """The `Popen` stdin for an input and what is left to feed through a pipe."""
+    if stdin is None:
+        return None, None
+    if isinstance(stdin, str) or not has_fileno(stdin):
+        return PIPE, stdin
+    return stdin, None
+
+def has_fileno(file):
+    try:
+        file.fileno()
+    except (AttributeError, OSError, UnsupportedOperation):
+        return False
+    return True
+
+def is_cat_file(argv):
+    return len(argv) == 2 and argv[0] == "cat" and not argv[1].startswith("-")
+
+def feed_stdin(pipe, stdin):
+    try:
+        if isinstance(stdin, str):
+            pipe.write(stdin)
+        else:
+            copyfileobj(stdin, pipe, CHUNK_SIZE)
+    except BrokenPipeError:
+        pass
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+async def async_run_native_subprocess_constant(ar, *args):
+    return run_native_subprocess_constant(ar, *await awaited_args(args))
+
+async def async_run_native_subprocess_map(ar, *args):
+    """Like `run_native_subprocess_map` with the branches as tasks of the running loop."""
+    b, params = split_args(ar, await awaited_args(args))
+    mapped = await asyncio.gather(*(kv(*tuplify(params)) for kv in b))
+    return untuplify(tuple(map(untuplify, mapped)))
+
+async def async_run_native_subprocess_seq(ar, *args):
+    b, params = split_args(ar, await awaited_args(args))
+    stages = native_stages(partial(async_run_native_subprocess_seq, ar, *b))
+    if stages is not None:
+        return await async_run_native_pipeline(stages, *params)
+    b0 = await b[0](*tuplify(params))
+    b1 = await b[1](*tuplify(b0))
+    return untuplify(b1)
+
+async def async_run_native_subprocess_default(ar, *args):
+    b, params = split_args(ar, await awaited_args(args))
+    return await async_run_native_pipeline(((ar.name, *b), ), *params)
+
+async def async_run_native_pipeline(stages, stdin=None):
+    """`run_native_pipeline` on `asyncio.create_subprocess_exec`."""
+    processes, read_end = [], None
+    source = None if stdin is None else PIPE
+    try:
+        for i, argv in enumerate(stages):
+            read_end, sink = (None, PIPE) if i == len(stages) - 1 else os.pipe()
+            try:
+                process = await asyncio.create_subprocess_exec(*argv, stdin=source, stdout=sink)
+            finally:
+                # The children hold their own copies of the pipe ends.
+                for fd in (source, sink):
+                    if fd not in (None, PIPE):
+                        os.close(fd)
+            processes.append(process)
+            source = read_end
+    except BaseException:
+        if read_end is not None:
+            os.close(read_end)
+        for process in processes:
+            process.kill()
+            await process.wait()
+        raise
+
+    async def feed():
+        if stdin is None:
+            return
+        try:
+            processes[0].stdin.write(stdin.encode())
+            await processes[0].stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        processes[0].stdin.close()
+
+    _, stdout = await asyncio.gather(feed(), processes[-1].stdout.read())
+    for process in processes:
+        await process.wait()
+    check_statuses(stages, [process.returncode for process in processes], stdout.decode())
+    return stdout.decode()
 
 def ar_mapping(ar):
     """
@@ -49,15 +389,90 @@ def ar_mapping(ar):
     if ar.name == "(||)":
         return partial(partial, run_native_subprocess_map, ar)
     if ar.name == "(;)":
-        return partial(partial, run_native_subprocess_seq, ar)
+        return partial(seq_program, ar)
     return partial(partial, run_native_subprocess_default, ar)
 
-SHELL_RUNNER = closed.Functor(
+class Runner(Memoized, closed.Functor):
+    """`closed.Functor` remembering the program of each box and diagram it has run."""
+
+SHELL_RUNNER = Runner(
     lambda ob: partial,
     ar_mapping,
     cod=closed.Category(python.Ty, python.Function))
 
 
+def async_ar_mapping(ar):
+    """`ar_mapping` where programs return coroutines to be awaited in an event loop."""
+    if isinstance(ar, closed.Curry) or ar.name == "⌜−⌝":
+        return partial(partial, async_run_native_subprocess_constant, ar)
+    if ar.name == "(||)":
+        return partial(partial, async_run_native_subprocess_map, ar)
+    if ar.name == "(;)":
+        return partial(partial, async_run_native_subprocess_seq, ar)
+    return partial(partial, async_run_native_subprocess_default, ar)
+
+async def awaited_args(args):
+    """args with each awaitable, e.g. the result of an `Eval`, replaced by its value."""
+    values = iter(await asyncio.gather(*(x for x in args if isawaitable(x))))
+    return tuple(next(values) if isawaitable(x) else x for x in args)
+
+class Awaited:
+    """
+    The result of calling a program on arguments, computed on first await:
+    the arguments are awaited, then the program and its result.
+    Every box awaiting it shares the one run.
+    """
+    def __init__(self, program, *args):
+        self.program, self.args, self.task = program, args, None
+
+    def __await__(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+        return self.task.__await__()
+
+    async def run(self):
+        result = self.program(*await awaited_args(self.args))
+        if isawaitable(result):
+            result = await result
+        if isinstance(result, tuple):
+            result = await awaited_args(result)
+        return result
+
+def async_eval(n, left, *xs):
+    """
+    `Eval` of the async runner: Python evaluates programs as soon as the diagram is applied,
+    so each of the n outputs is an `Awaited` run of the program instead of a coroutine.
+    """
+    program, xs = (xs[0], xs[1:]) if left else (xs[-1], xs[:-1])
+    result = Awaited(program, *xs)
+    if n == 1:
+        return result
+    return tuple(Awaited(lambda ys, i=i: tuplify(ys)[i], result) for i in range(n))
+
+class AsyncRunner(Runner):
+    """`Runner` where curried programs also return awaitables and `Eval` awaits what it runs."""
+    def __call__(self, other):
+        if isinstance(other, closed.Curry):
+            curried = self.cod.ar.curry(
+                self(other.arg), len(self(other.cod.exponent)), other.left)
+            return python.Function(
+                lambda *xs: partial(Awaited, curried(*xs)), curried.dom, curried.cod)
+        if isinstance(other, closed.Eval):
+            ev = self.cod.ar.ev(self(other.base), self(other.exponent), other.left)
+            return python.Function(partial(async_eval, len(ev.cod), other.left), ev.dom, ev.cod)
+        return super().__call__(other)
+
+ASYNC_SHELL_RUNNER = AsyncRunner(
+    lambda ob: partial,
+    async_ar_mapping,
+    cod=closed.Category(python.Ty, python.Function))
+
+# Programs `native_stages` can see through.
+NATIVE_PROGRAMS = (
+    run_native_subprocess_pipeline, run_native_subprocess_default, run_native_subprocess_seq,
+    async_run_native_subprocess_default, async_run_native_subprocess_seq)
+
+
 SHELL_COMPILER = closed.Functor(
     lambda ob: ob,
     lambda ar: {
@@ -69,9 +484,201 @@ SHELL_COMPILER = closed.Functor(
 
 def compile_shell_program(diagram):
     """
-    close input parameters (constants)
-    drop outputs matching input parameters
-    all boxes are io->[io]"""
-    # TODO compile sequences and parallels to evals
-    diagram = SHELL_COMPILER(diagram)
-    return diagram
+    Optimizing pass run before a program executes, every rewrite keeps dom and cod:
+    quoted `Data` is inlined as `Data.specialize()`,
+    `Curry(f)` going straight into its `Eval` is `f` so `Curry(Id)` wrappers vanish,
+    a copy deleted right away and empty copies and deletes are identities.
+    Native `(;)` chains are fused as the program is built, see `seq_program`.
+    """
+    inside, i = list(diagram.inside), 0
+    while i < len(inside):
+        rewrite = rewrite_layers(inside, i)
+        if rewrite is None:
+            i += 1
+            continue
+        n, layers = rewrite
+        inside[i:i + n] = layers
+        # The rewrite can complete a match with the previous layer.
+        i = max(i - 1, 0)
+    diagram = diagram.factory(tuple(inside), diagram.dom, diagram.cod, _scan=False)
+    return SHELL_COMPILER(diagram)
+
+def rewrite_layers(inside, i):
+    """The number of layers from i to replace and their replacement, or `None`."""
+    if len(inside[i].boxes_or_types) != 3:
+        return None
+    left, box, right = inside[i]
+    if isinstance(box, Data):
+        return 1, [left @ layer @ right for layer in box.specialize().inside]
+    if isinstance(box, (Copy, Delete)) and not box.dom and not box.cod:
+        return 1, []
+    if i + 1 == len(inside) or len(inside[i + 1].boxes_or_types) != 3:
+        return None
+    next_left, next_box, next_right = inside[i + 1]
+    if isinstance(box, markov.Copy) and isinstance(next_box, markov.Discard) \
+            and box.cod == box.dom @ box.dom and next_box.dom == box.dom \
+            and len(next_left) in (len(left), len(left) + len(box.dom)):
+        return 2, []
+    if isinstance(box, closed.Curry) and isinstance(next_box, closed.Eval) \
+            and len(next_left) == len(left) and next_box.dom[:len(box.cod)] == box.cod:
+        f = box.arg
+        if f.dom == box.dom @ next_box.dom[len(box.cod):] and f.cod == next_box.cod:
+            return 2, [left @ layer @ next_right for layer in f.inside]
+    return None
+
+
+def widish_main(file_name, draw):
+    fd = file_diagram(file_name)
+    path = Path(file_name)
+    if draw:
+        # The program runs while the drawing is made.
+        draw_async(path, fd)
+    program = widish_program(fd)
+    stages = native_stages(program)
+    if stages is not None:
+        # Our stdin goes straight to the first process.
+        stdin = "" if sys.stdin.isatty() else sys.stdin
+        if sys.stdout.isatty():
+            # On a terminal the output streams in `widish_format`.
+            output = FormattedOutput(sys.stdout)
+            run_native_pipeline(stages, stdin, output)
+            output.close()
+        else:
+            # Redirected, the last process writes to our stdout itself and its output is kept as is.
+            sys.stdout.flush()
+            run_native_pipeline(stages, stdin, sys.stdout)
+    else:
+        run_res = program("" if sys.stdin.isatty() else sys.stdin.read())
+        widish_print(run_res)
+    wait_drawings()
+
+def widish_stream_main(file_name):
+    """
+    Runs a stream of YAML documents one at a time as they arrive,
+    so that an unbounded stream keeps producing output in constant memory.
+    Reads documents from stdin when no file is given.
+    A document that fails is logged and the stream goes on, exits with status 1 in the end.
+    """
+    stream = open(file_name) if file_name else sys.stdin
+    failures = 0
+    with stream:
+        for i, source in enumerate(yaml_documents(stream)):
+            try:
+                widish_print(widish_run(event_read(source), ""))
+            except Exception as e:
+                logging.error(f"document {i + 1}: {e}")
+                failures += 1
+    if failures:
+        logging.error(f"{failures} documents failed")
+        sys.exit(1)
+
+def widish_batch_main(file_name, pattern, jobs=None, ordered=True):
+    """
+    Runs one program with each file matching pattern as stdin,
+    writing each result in input order or, unordered, as soon as it completes.
+    Exits with status 1 when some input failed.
+    """
+    fd = file_diagram(file_name)
+    paths = sorted(glob(pattern, recursive=True))
+    failures = 0
+    for path, result in widish_batch(fd, paths, jobs, ordered):
+        if isinstance(result, Exception):
+            logging.error(f"{path}: {result}")
+            failures += 1
+        else:
+            sys.stdout.write(result)
+            sys.stdout.flush()
+    if failures:
+        logging.error(f"{failures} of {len(paths)} inputs failed")
+        sys.exit(1)
+
+def widish_batch(fd, paths, jobs=None, ordered=True):
+    """
+    Yields each path with the output of fd on that file, or the exception it raised.
+    The program is built once, forked workers inherit it and other start methods rebuild it once per worker.
+    """
+    init_batch(fd)
+    if "fork" in get_all_start_methods():
+        # Pool forks every worker up front, before it starts any thread.
+        pool = get_context("fork").Pool(jobs)
+    else:
+        pool = get_context().Pool(jobs, initializer=init_batch, initargs=(fd, ))
+    with pool:
+        yield from (pool.imap if ordered else pool.imap_unordered)(batch_run, paths)
+
+# The program of a batch, set in the parent before its workers start.
+batch_program = None
+
+def init_batch(fd):
+    global batch_program
+    batch_program = widish_program(fd)
+
+def batch_run(path):
+    try:
+        stages = native_stages(batch_program)
+        with open(path) as stdin:
+            if stages is not None:
+                run_res = run_native_pipeline(stages, stdin)
+            else:
+                run_res = batch_program(stdin.read())
+        return path, widish_format(run_res)
+    except Exception as e:
+        return path, e
+
+def widish_program(fd):
+    constants = tuple(x.name for x in fd.dom)
+    return SHELL_RUNNER(compile_shell_program(fd))(*constants)
+
+def widish_run(fd, stdin):
+    return widish_program(fd)(stdin)
+
+def widish_print(run_res):
+    print(widish_format(run_res), end="", flush=True)
+
+def widish_format(run_res):
+    return "".join(f"{x.rstrip()}\n" for x in tuplify(untuplify(run_res)) if x) or "\n"
+
+class FormattedOutput:
+    """
+    Writes one output to file as it arrives in `widish_format`,
+    holding back only the trailing whitespace that may still be stripped.
+    """
+    def __init__(self, file):
+        self.file, self.pending = file, ""
+
+    def write(self, text):
+        text = self.pending + text
+        body = text.rstrip()
+        self.pending = text[len(body):]
+        self.file.write(body)
+
+    def close(self):
+        self.file.write("\n")
+        self.file.flush()
+
+def yaml_documents(lines):
+    """
+    Splits a YAML stream into document sources as soon as each one is complete,
+    i.e. at the next `---` marker, at a `...` end marker or at the end of the stream.
+    Documents with nothing but markers, comments and blank lines are skipped.
+    """
+    doc, content = [], False
+    for line in lines:
+        marker = line[:3]
+        separated = line[3:4] in ("", " ", "\t", "\r", "\n")
+        if marker == "---" and separated and content:
+            yield "".join(doc)
+            doc, content = [], False
+        doc.append(line)
+        if marker == "..." and separated:
+            if content:
+                yield "".join(doc)
+            doc, content = [], False
+        elif marker == "---" and separated:
+            # Only what follows the marker counts, a bare `---` starts an empty document.
+            rest = line[3:].strip()
+            content = bool(rest) and not rest.startswith("#")
+        elif not line.lstrip().startswith(("#", "%")) and line.strip():
+            content = True
+    if content:
+        yield "".join(doc)